@@ -14,80 +14,263 @@ CLI-инструмент для потоковой обработки CSV: ав
 """
 
 import argparse
+import atexit
 import csv
-import chardet
+import codecs
+import functools
+import io
+import json
 import logging
+import os
+import queue
+import shutil
+import signal
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Generator, Tuple
 
-# Настройка логгера
-from logging.handlers import RotatingFileHandler
-from config import LOGS_DIR
+try:
+    import cchardet as chardet  # C-реализация (faust-cchardet), API совместим с chardet
+except Exception:
+    import chardet
+
+try:
+    import numpy as np
+except ImportError:  # numpy опционален: без него статистика считается через csv.reader
+    np = None
+
+# Настройка логгера: при импорте модуля (например, из UI) только берём логгер по имени,
+# обработчики и файл лога создаются лениво при первом вызове _get_logger()
+from config import DIRS
 
 logger = logging.getLogger("streaming_csv_parser")
-logger.setLevel(logging.INFO)
+_log_listener: QueueListener | None = None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_logger() -> logging.Logger:
+    """
+    Настраивает логгер один раз на процесс: ротация файлов в общем каталоге логов + консоль.
+    Запись в обработчики идёт в фоновом потоке QueueListener, вызовы logger.* лишь кладут запись в очередь.
+    """
+    logger.setLevel(logging.INFO)
+
+    log_file = (DIRS.logs / 'streaming_csv_parser.log')
+    file_handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
+    console_handler = logging.StreamHandler()
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+
+    global _log_listener
+    log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, file_handler, console_handler)
+    _log_listener.start()
+    # stop() дожидается записи всех сообщений из очереди
+    atexit.register(_log_listener.stop)
+    logger.addHandler(QueueHandler(log_queue))
+    return logger
+
+
+def _flush_logger() -> None:
+    """Дождаться вывода уже отправленных в логгер сообщений — перед прямой записью в stdout."""
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener.start()
 
-# Создаём обработчики: ротация файлов в общем каталоге логов + консоль
-log_file = (LOGS_DIR / 'streaming_csv_parser.log')
-file_handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
-console_handler = logging.StreamHandler()
 
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
+# Бинарный канал прогресса (--progress_file): записи фиксированной длины (valid, bad, phase),
+# phase: 0 — идёт обработка, 1 — обработка завершена. UI читает последнюю запись.
+PROGRESS_RECORD = struct.Struct('<QQI')
+PROGRESS_EVERY = 5000
 
-# Избежать дублирования хэндлеров при повторном импорте
-if not logger.handlers:
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+# Буфер файловых операций: 1 MiB вместо стандартных 8 KiB — на порядки меньше системных вызовов
+IO_BUFFER_BYTES = 1 << 20
+# Порог сброса накопленных строк вывода на диск
+WRITE_FLUSH_BYTES = 1 << 20
+
+# Кэш результатов автоопределения рядом с входным файлом (<file>.sniff.json).
+# Версию повышаем при любом изменении алгоритмов определения — старые кэши станут недействительны.
+SNIFF_CACHE_SUFFIX = '.sniff.json'
+SNIFF_CACHE_VERSION = 2
+
+# csv.Sniffer работает регулярками с возможным катастрофическим бэктрекингом:
+# кормим его только началом сэмпла и ограничиваем время работы
+SNIFF_MAX_CHARS = 16 * 1024
+SNIFF_TIMEOUT_SECONDS = 2.0
+
+# Параллельная обработка: тело файла режется на куски по границам строк и обрабатывается пулом процессов.
+# По умолчанию включается для файлов от PARALLEL_MIN_BYTES; PARALLEL_CHECKPOINTS ограничивает, сколько
+# границ записей в начале куска запоминается для сшивки с концом предыдущего куска.
+PARALLEL_CHUNK_BYTES = 64 << 20
+PARALLEL_MIN_BYTES = 128 << 20
+PARALLEL_CHECKPOINTS = 1000
+
+# Не чаще одного предупреждения об исключении при обработке строки в секунду
+WARN_INTERVAL_SECONDS = 1.0
+
+# Кодировки (имена по codecs.lookup), тело которых читается байтами: вывод и так в UTF-8,
+# поэтому валидная строка без кавычек переносится в него без декодирования и повторного кодирования
+PASSTHROUGH_ENCODINGS = ('utf-8', 'utf-8-sig', 'ascii')
+
+
+# BOM -> кодировка; UTF-32 проверяется раньше UTF-16, т.к. BOM UTF-32-LE начинается с BOM UTF-16-LE
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def _is_utf8(raw: bytes) -> bool:
+    """Корректен ли сэмпл как UTF-8; обрезанный на границе сэмпла многобайтный символ допустим."""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(raw, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
 
 
 def detect_encoding(file_path: Path, sample_size: int = 10000) -> str:
-    """Определяет кодировку файла."""
+    """
+    Определяет кодировку файла: BOM, затем проверка на UTF-8 (покрывает ASCII),
+    и только после этого статистическое определение (faust-cchardet, при его отсутствии — chardet).
+    """
     try:
         with open(file_path, "rb") as f:
             raw_data = f.read(sample_size)
-            result = chardet.detect(raw_data)
-            if result["confidence"] or 0.1 < 0.7:
-                encoding = "utf-8"
+        for bom, bom_encoding in _BOMS:
+            if raw_data.startswith(bom):
+                encoding = bom_encoding
+                break
+        else:
+            if _is_utf8(raw_data):
+                encoding = 'utf-8'
             else:
-                encoding = result['encoding'] or 'utf-8'
+                result = chardet.detect(raw_data)
+                encoding = result['encoding'] if (result['confidence'] or 0.0) >= 0.7 else None
+                encoding = encoding or 'utf-8'
             if encoding.lower() == 'ascii':
                 encoding = 'utf-8'
 
-            logger.info(f"✅ Определена кодировка: {encoding}")
-            return encoding
+        logger.info(f"✅ Определена кодировка: {encoding}")
+        return encoding
     except Exception as e:
         logger.warning(f"⚠️ Ошибка определения кодировки: {e}. Используем utf-8")
         return 'utf-8'
 
 
+def _sniff_timeout(signum, frame):
+    raise TimeoutError("csv.Sniffer превысил лимит времени")
+
+
+def sniff_delimiter(sample: str) -> str | None:
+    """
+    Разделитель по csv.Sniffer на первых SNIFF_MAX_CHARS символах сэмпла (обрезка по границе строки).
+    В главном потоке на POSIX работа ограничена SNIFF_TIMEOUT_SECONDS через SIGALRM.
+    Возвращает None, если Sniffer не справился или не уложился во время.
+    """
+    if len(sample) > SNIFF_MAX_CHARS:
+        cut = sample.rfind('\n', 0, SNIFF_MAX_CHARS)
+        sample = sample[:cut + 1] if cut > 0 else sample[:SNIFF_MAX_CHARS]
+    use_alarm = hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _sniff_timeout)
+        signal.setitimer(signal.ITIMER_REAL, SNIFF_TIMEOUT_SECONDS)
+    try:
+        return csv.Sniffer().sniff(sample).delimiter
+    except TimeoutError:
+        logger.warning(f"⚠️ csv.Sniffer не уложился в {SNIFF_TIMEOUT_SECONDS} с")
+        return None
+    except csv.Error:
+        return None
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
 def detect_delimiter(file_path: Path, encoding: str, max_lines: int = 30) -> str:
     """Определяет разделитель CSV."""
     try:
-        with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
+        with open(file_path, 'r', encoding=encoding, errors='ignore', buffering=IO_BUFFER_BYTES) as f:
             lines = [f.readline() for _ in range(max_lines)]
             sample = ''.join(lines)
 
             # Используем встроенный CSV sniffer
-            sniffer = csv.Sniffer()
-            try:
-                dialect = sniffer.sniff(sample)
-                delimiter = dialect.delimiter
+            delimiter = sniff_delimiter(sample)
+            if delimiter:
                 logger.info(f"✅ Определен разделитель: {repr(delimiter)}")
                 return delimiter
-            except csv.Error:
-                # Fallback на частотный анализ
-                delimiters = [',', ';', '\t', '|']
-                counts = {d: sum(line.count(d) for line in lines) for d in delimiters}
-                delimiter = max(counts, key=counts.get)
-                logger.info(f"✅ Определен разделитель (частотный анализ): {repr(delimiter)}")
-                return delimiter
+            # Fallback на частотный анализ
+            delimiters = [',', ';', '\t', '|']
+            counts = {d: sum(line.count(d) for line in lines) for d in delimiters}
+            delimiter = max(counts, key=counts.get)
+            logger.info(f"✅ Определен разделитель (частотный анализ): {repr(delimiter)}")
+            return delimiter
     except Exception as e:
         logger.warning(f"⚠️ Ошибка определения разделителя: {e}. Используем запятую")
         return ','
 
 
+def _vector_line_lengths(lines: list[str]):
+    """
+    Готовит векторный подсчёт числа колонок в строках сэмпла: возвращает функцию
+    delimiter -> np.ndarray длин строк (как len(row) у csv.reader) или None, если векторный путь неприменим.
+    Применим, когда в сэмпле нет кавычек, NUL и одиночных \r — тогда число колонок равно
+    числу разделителей + 1, а пустая строка даёт 0 колонок.
+    """
+    if np is None or not lines:
+        return None
+    sample_text = ''.join(lines)
+    if '"' in sample_text or '\x00' in sample_text or sample_text.count('\r') != sample_text.count('\r\n'):
+        return None
+    lens = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+    if int(lens.max()) >= csv.field_size_limit():
+        return None
+    ends = np.cumsum(lens)
+    starts = ends - lens
+    blank = np.fromiter((line == '\n' or line == '\r\n' for line in lines), dtype=bool, count=len(lines))
+    codes = np.frombuffer(sample_text.encode('utf-32-le'), dtype=np.uint32)
+
+    def lengths_of(delimiter: str):
+        if len(delimiter) != 1 or delimiter in '\r\n':
+            return None
+        # Префиксные суммы совпадений: число разделителей в строке = cum[end] - cum[start]
+        cum = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(codes == ord(delimiter), out=cum[1:])
+        lengths = cum[ends] - cum[starts] + 1
+        lengths[blank] = 0
+        return lengths
+
+    return lengths_of
+
+
+def _vector_stats(lengths) -> tuple:
+    """(modal_share, modal_cols, modal_count, header_cols, total_rows) по массиву длин строк."""
+    header_cols = int(lengths[0])
+    data_lengths = lengths[1:]
+    if len(data_lengths):
+        hist = np.bincount(data_lengths)
+        # argmax по развёрнутой гистограмме — при равенстве частот выбираем большее число колонок
+        modal_cols = len(hist) - 1 - int(hist[::-1].argmax())
+        modal_count = int(hist[modal_cols])
+        modal_share = modal_count / len(data_lengths)
+    else:
+        modal_cols, modal_count, modal_share = header_cols, 0, 1.0
+    return modal_share, modal_cols, modal_count, header_cols, len(lengths)
+
+
 def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, provided_delimiter: str | None = None):
     """
     Статистически анализирует первые max_lines строк, подбирая разделитель и структуру.
@@ -99,9 +282,9 @@ def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, pr
     - Если все кандидаты дают 1 колонку, используем частотный анализ (среднее число вхождений разделителя) и
       повторно считаем статистику для лучшего по частоте кандидата.
     """
-    import io as _io
     try:
-        with open(file_path, 'r', encoding=encoding, errors='ignore', newline='') as f:
+        with open(file_path, 'r', encoding=encoding, errors='ignore', newline='',
+                  buffering=IO_BUFFER_BYTES) as f:
             lines = []
             for _ in range(max_lines):
                 line = f.readline()
@@ -116,34 +299,38 @@ def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, pr
         candidates: list[str] = []
         if provided_delimiter:
             candidates.append(provided_delimiter)
+        sample_text = ''.join(lines)
         # Попробуем sniffer
-        try:
-            sniffed = csv.Sniffer().sniff(''.join(lines)).delimiter
-            if sniffed and sniffed not in candidates:
-                candidates.append(sniffed)
-        except Exception:
-            pass
+        sniffed = sniff_delimiter(sample_text)
+        if sniffed and sniffed not in candidates:
+            candidates.append(sniffed)
         # Добавим базовые
         for d in base_candidates:
             if d not in candidates:
                 candidates.append(d)
 
         results = []  # (modal_share, modal_cols, modal_count, delim, header_cols, total_rows)
-        freq_counts = {}  # среднее число вхождений delimeter в строке
-        sample_text = ''.join(lines)
+        # Среднее число вхождений разделителя в строке: один проход str.count по склеенному сэмплу
+        # на кандидата вместо цикла по строкам
+        freq_counts = {d: sample_text.count(d) / len(lines) for d in candidates}
+        # Один буфер на все проходы csv.reader: между кандидатами только seek(0)
+        sample_io = io.StringIO(sample_text)
+        lengths_of = _vector_line_lengths(lines)
         for d in candidates:
             try:
-                # Частотные характеристики
-                if lines:
-                    freq_counts[d] = sum(line.count(d) for line in lines) / max(1, len(lines))
-                reader = csv.reader(_io.StringIO(sample_text), delimiter=d, quoting=csv.QUOTE_MINIMAL)
+                vector_lengths = lengths_of(d) if lengths_of is not None else None
+                if vector_lengths is not None:
+                    modal_share, modal_cols, modal_count, header_cols, total_rows_local = _vector_stats(vector_lengths)
+                    results.append((modal_share, modal_cols, modal_count, d, header_cols, total_rows_local))
+                    continue
+                sample_io.seek(0)
+                reader = csv.reader(sample_io, delimiter=d, quoting=csv.QUOTE_MINIMAL)
                 lengths = [len(row) for row in reader]
                 if not lengths:
                     continue
                 header_cols = lengths[0]
                 data_lengths = lengths[1:] if len(lengths) > 1 else []
                 if data_lengths:
-                    from collections import Counter
                     cnt = Counter(data_lengths)
                     modal_cols, modal_count = max(cnt.items(), key=lambda kv: (kv[1], kv[0]))
                     modal_share = modal_count / max(1, len(data_lengths))
@@ -157,18 +344,12 @@ def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, pr
             # Фолбэк: попробуем выбрать разделитель по частоте вхождений и вернуть консервативные оценки
             try:
                 if lines:
-                    # Обновим freq_counts если пустой
-                    if not freq_counts:
-                        for d in candidates:
-                            try:
-                                freq_counts[d] = sum(line.count(d) for line in lines) / max(1, len(lines))
-                            except Exception:
-                                freq_counts[d] = 0.0
                     # Выбираем разделитель с максимальной средней частотой
                     best_d = max(freq_counts.items(), key=lambda kv: kv[1])[0] if freq_counts else ','
                     # Пытаемся распарсить ещё раз аккуратно
                     try:
-                        reader = csv.reader(_io.StringIO(sample_text), delimiter=best_d, quoting=csv.QUOTE_MINIMAL)
+                        sample_io.seek(0)
+                        reader = csv.reader(sample_io, delimiter=best_d, quoting=csv.QUOTE_MINIMAL)
                         lengths = [len(row) for row in reader]
                     except Exception:
                         # Грубая оценка: по split
@@ -178,7 +359,6 @@ def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, pr
                     header_cols = lengths[0]
                     data_lengths = lengths[1:] if len(lengths) > 1 else []
                     if data_lengths:
-                        from collections import Counter
                         cnt = Counter(data_lengths)
                         modal_cols, modal_count = max(cnt.items(), key=lambda kv: (kv[1], kv[0]))
                         modal_share = modal_count / max(1, len(data_lengths))
@@ -213,12 +393,12 @@ def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, pr
             if freq_counts:
                 best_d = max(freq_counts.items(), key=lambda kv: kv[1])[0]
                 # Пересчитаем статистику для best_d
-                reader = csv.reader(_io.StringIO(sample_text), delimiter=best_d, quoting=csv.QUOTE_MINIMAL)
+                sample_io.seek(0)
+                reader = csv.reader(sample_io, delimiter=best_d, quoting=csv.QUOTE_MINIMAL)
                 lengths = [len(row) for row in reader]
                 header_cols = lengths[0] if lengths else 1
                 data_lengths = lengths[1:] if len(lengths) > 1 else []
                 if data_lengths:
-                    from collections import Counter
                     cnt = Counter(data_lengths)
                     modal_cols, modal_count = max(cnt.items(), key=lambda kv: (kv[1], kv[0]))
                     modal_share = modal_count / max(1, len(data_lengths))
@@ -233,10 +413,454 @@ def analyze_csv_stats(file_path: Path, encoding: str, max_lines: int = 10000, pr
         raise ValueError(f"Ошибка статистического анализа CSV: {e}")
 
 
+def _quote_all(fields, quoted_sep: str) -> str:
+    """Форматирует строку как csv.writer с QUOTE_ALL: каждое поле в кавычках, терминатор \r\n."""
+    if not fields:
+        return '\r\n'
+    return '"' + quoted_sep.join([f.replace('"', '""') for f in fields]) + '"\r\n'
+
+
+class _ByteRange(io.RawIOBase):
+    """Сырой поток байтов файла в диапазоне [start, end); end=None — до конца файла."""
+
+    def __init__(self, path: Path, start: int, end: int | None = None):
+        self._f = open(path, 'rb', buffering=0)
+        self._f.seek(start)
+        self._left = None if end is None else end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._left is not None:
+            if self._left <= 0:
+                return 0
+            b = memoryview(b)[:self._left]
+        n = self._f.readinto(b)
+        if self._left is not None:
+            self._left -= n
+        return n
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def _is_passthrough(encoding: str) -> bool:
+    """Читать ли тело файла в этой кодировке байтами (см. PASSTHROUGH_ENCODINGS)."""
+    try:
+        return codecs.lookup(encoding).name in PASSTHROUGH_ENCODINGS
+    except LookupError:
+        return False
+
+
+class _Utf8Lines:
+    """
+    Построчное чтение сырого потока байтов в кодировке из PASSTHROUGH_ENCODINGS. readline() отдаёт строки
+    байтами в UTF-8 — те же, что дал бы текстовый режим (errors='ignore', newline=''): перевод строки —
+    \r, \n или \r\n, недекодируемые байты отброшены. Блок проверяется на корректность целиком,
+    перекодируется только блок с ошибками.
+    """
+
+    def __init__(self, raw, encoding: str):
+        self._raw = raw
+        # Тело читается не с начала файла: BOM utf-8-sig уже снят вместе с заголовком
+        self._codec = 'ascii' if codecs.lookup(encoding).name == 'ascii' else 'utf-8'
+        self.readline = functools.partial(next, self._lines(), b'')
+
+    def _normalize(self, block: bytes) -> bytes:
+        if not block.isascii():
+            try:
+                block.decode(self._codec)
+            except UnicodeDecodeError:
+                block = block.decode(self._codec, errors='ignore').encode('utf-8')
+        return block
+
+    def _lines(self):
+        tail = b''
+        while True:
+            block = self._raw.read(IO_BUFFER_BYTES)
+            if not block:
+                break
+            # Блок режем по последнему \n: \r\n и многобайтные символы не разрываются
+            cut = block.rfind(b'\n') + 1
+            if not cut:
+                tail += block
+                continue
+            block, tail = tail + block[:cut], block[cut:]
+            yield from self._normalize(block).splitlines(keepends=True)
+        if tail:
+            yield from self._normalize(tail).splitlines(keepends=True)
+
+    def close(self) -> None:
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _open_range(path: Path, encoding: str, start: int, end: int | None = None, binary: bool = False):
+    """
+    Поток строк по диапазону байтов файла — с теми же параметрами декодирования, что и основной вход;
+    binary=True — строки байтами в UTF-8 (_Utf8Lines).
+    """
+    if binary:
+        return _Utf8Lines(_ByteRange(path, start, end), encoding)
+    return io.TextIOWrapper(io.BufferedReader(_ByteRange(path, start, end), IO_BUFFER_BYTES),
+                            encoding=encoding, errors='ignore', newline='')
+
+
+class _LazyFile:
+    """
+    Бинарный файл, который создаётся только при первой непустой записи (с заголовком header) —
+    для bad-файлов, которых на чистом входе может не быть вовсе. Закрывается через ExitStack владельца.
+    """
+
+    def __init__(self, stack: ExitStack, path: Path, header: bytes = b''):
+        self._stack = stack
+        self._path = path
+        self._header = header
+        self._fh = None
+
+    def write(self, data) -> int:
+        if not data:
+            return 0
+        if self._fh is None:
+            self._fh = self._stack.enter_context(open(self._path, 'wb', buffering=IO_BUFFER_BYTES))
+            self._fh.write(self._header)
+        return self._fh.write(data)
+
+    def tell(self) -> int:
+        return self._fh.tell() if self._fh is not None else 0
+
+
+def _parse_row(text: str, delimiter: str):
+    """Разбирает одну строку CSV в список полей; None — строку не удалось разобрать."""
+    # Строка без кавычек токенизируется простым split по разделителю — результат совпадает с csv.reader,
+    # пока ни одно поле не длиннее csv.field_size_limit() (на таком поле csv.reader падает)
+    line = text.rstrip('\r\n')
+    if line and '"' not in line and len(line) < csv.field_size_limit():
+        return line.split(delimiter)
+    try:
+        # csv.reader по кортежу из одной строки — без StringIO на каждую строку
+        return next(csv.reader((text,), delimiter=delimiter, quoting=csv.QUOTE_MINIMAL), [])
+    except Exception:
+        return None
+
+
+def _process_rows(readline, outfile, badfile, badraw, delimiter: str, quoted_sep: str, expected_columns: int,
+                  line_no: int = 2, batch_size: int = 0, bad_log_every: int = 0, progress=None,
+                  read_beyond=None, checkpoints: dict | None = None, stop_at=None, binary: bool = False):
+    """
+    Построчная валидация: строки берутся из readline(), валидные пишутся в outfile, дефектные — в badfile
+    и сырыми в badraw (все три потока бинарные). Невалидная строка пробует склеиться с одной следующей.
+    binary — readline() отдаёт строки байтами в UTF-8 (_Utf8Lines); декодируются только строки,
+    которым нужен разбор на поля.
+    line_no — номер первой строки для bad-файла; batch_size/bad_log_every — шаг логирования (0 — не логировать).
+    Параметры для обработки куска файла в отдельном процессе:
+    - read_beyond() — первая строка за концом куска: нужна только для склейки последней строки;
+    - checkpoints — словарь line_no -> (out_pos, bad_pos, raw_pos, valid, bad) на старте первых
+      PARALLEL_CHECKPOINTS записей;
+    - stop_at — номера строк, на старте которых обработка останавливается.
+    Возвращает (valid, bad, next_line_no, consumed_beyond, stopped_at).
+    """
+    valid_count = 0
+    bad_count = 0
+    consumed_beyond = False
+    stopped_at = None
+
+    # Вывод копится в bytearray и сбрасывается блоками по WRITE_FLUSH_BYTES
+    # (формат совпадает с csv.writer(delimiter=export_delimiter, quoting=csv.QUOTE_ALL))
+    out_buf = bytearray()
+    bad_buf = bytearray()
+    raw_buf = bytearray()
+
+    def _write_bad(line_no: int, kind: str, desc: str, content: str, raw: str):
+        bad_buf.extend(_quote_all([str(line_no), kind, desc, content], quoted_sep).encode('utf-8'))
+        raw_buf.extend(raw.encode('utf-8'))
+        if len(bad_buf) > WRITE_FLUSH_BYTES:
+            badfile.write(bad_buf)
+            bad_buf.clear()
+        if len(raw_buf) > WRITE_FLUSH_BYTES:
+            badraw.write(raw_buf)
+            raw_buf.clear()
+
+    # Обрабатываем строки потоково с возможностью склейки двух последовательных строк
+    parse_row = _parse_row
+    phys_line_no = line_no
+    # Очередь строк, прочитанных наперёд: строка, не подошедшая для склейки,
+    # возвращается сюда и обрабатывается на следующей итерации
+    pending = deque()
+    next_progress = PROGRESS_EVERY
+    # Пороги следующей записи в лог вместо проверки остатка на каждой строке; -1 — недостижим
+    next_valid_log = batch_size or -1
+    next_bad_log = bad_log_every or -1
+    last_warn = -WARN_INTERVAL_SECONDS
+    out_extend = out_buf.extend
+    separators = expected_columns - 1
+    # Быстрый путь только для строк короче лимита поля: длиннее — решает csv.reader (он на них падает)
+    field_limit = csv.field_size_limit()
+    quote_byte = ord('"')
+    delimiter_b = delimiter.encode('utf-8')
+    quoted_sep_b = quoted_sep.encode('utf-8')
+    while True:
+        if progress is not None and valid_count + bad_count >= next_progress:
+            progress.write(PROGRESS_RECORD.pack(valid_count, bad_count, 0))
+            next_progress += PROGRESS_EVERY
+        if stop_at is not None and phys_line_no in stop_at:
+            stopped_at = phys_line_no
+            break
+        if checkpoints is not None and len(checkpoints) < PARALLEL_CHECKPOINTS:
+            checkpoints[phys_line_no] = (outfile.tell() + len(out_buf), badfile.tell() + len(bad_buf),
+                                         badraw.tell() + len(raw_buf), valid_count, bad_count)
+        try:
+            cur_line = pending.popleft() if pending else readline()
+            if not cur_line:
+                break
+
+            # Быстрый путь: строка без кавычек с нужным числом разделителей валидна без разбора на поля;
+            # поля не нужно экранировать, и QUOTE_ALL сводится к замене разделителя
+            record = None
+            consumed = 1
+            if binary:
+                # Тот же быстрый путь над байтами; проверка байта-числа через in заметно быстрее подстроки
+                if quote_byte not in cur_line:
+                    content = cur_line.rstrip(b'\r\n')
+                    if content and len(content) < field_limit and content.count(delimiter_b) == separators:
+                        record = b'"' + content.replace(delimiter_b, quoted_sep_b) + b'"\r\n'
+                if record is None:
+                    cur_line = cur_line.decode('utf-8')
+            elif '"' not in cur_line:
+                content = cur_line.rstrip('\r\n')
+                if content and len(content) < field_limit and content.count(delimiter) == separators:
+                    record = ('"' + content.replace(delimiter, quoted_sep) + '"\r\n').encode('utf-8')
+            if record is None:
+                row = parse_row(cur_line, delimiter)
+                if row is None or len(row) != expected_columns:
+                    # Невалидная — пробуем склеить с одной следующей строкой
+                    next_raw = readline()
+                    beyond = not next_raw and read_beyond is not None
+                    if beyond:
+                        next_raw = read_beyond()
+                    next_line = next_raw.decode('utf-8') if binary else next_raw
+                    joined = None
+                    if next_line:
+                        joined = parse_row(cur_line.rstrip('\r\n') + next_line.lstrip('\r\n'), delimiter)
+                    if joined is not None and len(joined) == expected_columns:
+                        row = joined
+                        consumed = 2
+                        consumed_beyond = beyond
+                    else:
+                        # Склейка не помогла (или строк больше нет) — в bad идёт только текущая строка,
+                        # следующую возвращаем в очередь для самостоятельной обработки
+                        # (строку из следующего куска обработает его процесс)
+                        if next_line and not beyond:
+                            pending.append(next_raw)
+                        content = cur_line.rstrip('\r\n')
+                        if not content.strip():
+                            desc = "Пустая строка"
+                        elif row is not None:
+                            desc = f"Неверное количество столбцов: {len(row)} вместо {expected_columns}"
+                        else:
+                            desc = f"Неверная строка (ожидалось {expected_columns} столбцов)"
+                        # В файл сырых ошибок пишем строку без изменений
+                        _write_bad(phys_line_no, "Ошибка_структуры", desc, content, cur_line)
+                        bad_count += 1
+                        if bad_count == next_bad_log:
+                            logger.warning("⚠️ Невалидных строк: %d", bad_count)
+                            next_bad_log += bad_log_every
+                        phys_line_no += 1
+                        continue
+
+                # Валидная строка (или удачная склейка двух) — пишем как QUOTE_ALL
+                record = _quote_all(row, quoted_sep).encode('utf-8')
+            out_extend(record)
+            if len(out_buf) > WRITE_FLUSH_BYTES:
+                outfile.write(out_buf)
+                out_buf.clear()
+            valid_count += 1
+            if valid_count == next_valid_log:
+                logger.info("✅ Обработано валидных строк: %d", valid_count)
+                next_valid_log += batch_size
+            phys_line_no += consumed
+
+        except Exception as e:
+            # Ошибка при обработке
+            error_desc = f"Ошибка обработки: {str(e)[:100]}"
+            # В файл сырых ошибок пишем исходную строку, если она есть
+            raw_line = cur_line if 'cur_line' in locals() else ''
+            if isinstance(raw_line, bytes):
+                raw_line = raw_line.decode('utf-8', errors='ignore')
+            _write_bad(phys_line_no, "Ошибка_обработки", error_desc, raw_line.rstrip('\r\n'), raw_line)
+            bad_count += 1
+            if bad_count == next_bad_log:
+                next_bad_log += bad_log_every
+            # На патологическом входе исключение может быть на каждой строке — логируем не чаще
+            # WARN_INTERVAL_SECONDS, сообщение между тиками не форматируется вовсе
+            if bad_log_every:
+                now = time.monotonic()
+                if now - last_warn >= WARN_INTERVAL_SECONDS:
+                    logger.warning("⚠️ Ошибка обработки строки %d: %s (невалидных строк: %d)",
+                                   phys_line_no, e, bad_count)
+                    last_warn = now
+            phys_line_no += 1
+
+    outfile.write(out_buf)
+    badfile.write(bad_buf)
+    badraw.write(raw_buf)
+    return valid_count, bad_count, phys_line_no, consumed_beyond, stopped_at
+
+
+def _parallel_workers(workers: int | None, encoding: str, body_bytes: int) -> int:
+    """Сколько процессов использовать для тела файла; 1 — обрабатывать последовательно."""
+    # Деление на куски по байту \n корректно, только если перевод строки кодируется одним этим байтом
+    # (UTF-8, однобайтные кодировки); в UTF-16/32 это не так
+    if '\n\r'.encode(encoding)[-2:] != b'\n\r':
+        return 1
+    if workers is None:
+        if body_bytes < PARALLEL_MIN_BYTES:
+            return 1
+        workers = os.cpu_count() or 1
+    chunks = -(-body_bytes // PARALLEL_CHUNK_BYTES)
+    return max(1, min(workers, chunks))
+
+
+def _chunk_bounds(path: Path, start: int, size: int) -> list[tuple[int, int]]:
+    """Режет [start, size) на куски ~PARALLEL_CHUNK_BYTES, сдвигая границы на начало следующей строки."""
+    bounds = []
+    with open(path, 'rb') as f:
+        pos = start
+        while pos < size:
+            cut = pos + PARALLEL_CHUNK_BYTES
+            if cut < size:
+                f.seek(cut)
+                f.readline()
+                cut = f.tell()
+            cut = min(cut, size)
+            bounds.append((pos, cut))
+            pos = cut
+    return bounds
+
+
+def _process_chunk(task: dict) -> dict:
+    """
+    Обрабатывает кусок файла в отдельном процессе. Номера строк в bad-файлах — относительные (с 0),
+    абсолютные проставляются при слиянии. Для всех кусков, кроме первого, дополнительно считается
+    вариант «первая строка уже склеена с концом предыдущего куска» (alt): он идёт со второй строки до
+    первой общей с основным проходом границы записи, дальше результаты совпадают.
+    """
+    path, encoding, start, end, size = task['path'], task['encoding'], task['start'], task['end'], task['size']
+    binary = task['binary']
+    row_args = (task['delimiter'], task['quoted_sep'], task['expected_columns'])
+
+    def read_beyond():
+        if end >= size:
+            return b'' if binary else ''
+        with _open_range(path, encoding, end, binary=binary) as f:
+            return f.readline()
+
+    def run(prefix: str, skip_first: bool, **kwargs):
+        parts = [task['tmp_dir'] / f"{task['index']}.{prefix}.{ext}" for ext in ('out', 'bad', 'raw')]
+        with _open_range(path, encoding, start, end, binary=binary) as src, \
+                open(parts[0], 'wb', buffering=IO_BUFFER_BYTES) as out, \
+                open(parts[1], 'wb', buffering=IO_BUFFER_BYTES) as bad, \
+                open(parts[2], 'wb', buffering=IO_BUFFER_BYTES) as raw:
+            if skip_first:
+                src.readline()
+            return _process_rows(src.readline, out, bad, raw, *row_args, line_no=int(skip_first),
+                                 read_beyond=read_beyond, binary=binary, **kwargs)
+
+    checkpoints = {} if task['with_alt'] else None
+    valid, bad, next_line_no, consumed, _ = run('main', False, checkpoints=checkpoints)
+    result = {'n_lines': next_line_no - consumed, 'main': (valid, bad, consumed), 'alt': None}
+    if task['with_alt']:
+        valid, bad, _, consumed, stopped_at = run('alt', True, stop_at=checkpoints)
+        result['alt'] = (valid, bad, consumed, checkpoints.get(stopped_at))
+    return result
+
+
+def _copy_bad_records(src, dst, line_base: int) -> None:
+    """Копирует записи bad-файла куска, переводя относительные номера строк в абсолютные."""
+    # Содержимое записи не содержит переводов строк, так что одна запись — одна строка файла
+    for record in src:
+        try:
+            quote = record.index(b'"', 1)
+            dst.write(b'"%d' % (int(record[1:quote]) + line_base) + record[quote:])
+        except ValueError:
+            dst.write(record)
+
+
+def _process_parallel(input_path: Path, outfile, badfile, badraw, encoding: str, delimiter: str,
+                      quoted_sep: str, expected_columns: int, start: int, workers: int, progress=None,
+                      binary: bool = False):
+    """Обработка тела файла [start, EOF) кусками в пуле процессов со слиянием результатов по порядку."""
+    size = input_path.stat().st_size
+    bounds = _chunk_bounds(input_path, start, size)
+    tmp_dir = Path(tempfile.mkdtemp(prefix='csv_parts_', dir=Path(outfile.name).parent))
+    logger.info(f"🧩 Параллельная обработка: {len(bounds)} кусков, процессов: {workers}")
+    tasks = [{
+        'index': i, 'path': input_path, 'encoding': encoding, 'start': s, 'end': e, 'size': size,
+        'delimiter': delimiter, 'quoted_sep': quoted_sep, 'expected_columns': expected_columns,
+        'tmp_dir': tmp_dir, 'with_alt': i > 0, 'binary': binary,
+    } for i, (s, e) in enumerate(bounds)]
+
+    valid_count = bad_count = 0
+    line_base = 2
+    consumed_prev = False
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i, result in enumerate(pool.map(_process_chunk, tasks)):
+                valid, bad, consumed = result['main']
+                # (префикс alt-прохода, смещения в основном проходе, с которых продолжать)
+                segments = [('main', (0, 0, 0))]
+                if consumed_prev:
+                    alt_valid, alt_bad, alt_consumed, checkpoint = result['alt']
+                    if checkpoint is None:
+                        # alt не сошёлся с основным проходом — берём его целиком
+                        segments = [('alt', (0, 0, 0))]
+                        valid, bad, consumed = alt_valid, alt_bad, alt_consumed
+                    else:
+                        out_pos, bad_pos, raw_pos, cp_valid, cp_bad = checkpoint
+                        segments = [('alt', (0, 0, 0)), ('main', (out_pos, bad_pos, raw_pos))]
+                        valid, bad = alt_valid + valid - cp_valid, alt_bad + bad - cp_bad
+                for prefix, (out_pos, bad_pos, raw_pos) in segments:
+                    with open(tmp_dir / f"{i}.{prefix}.out", 'rb') as f:
+                        f.seek(out_pos)
+                        shutil.copyfileobj(f, outfile, IO_BUFFER_BYTES)
+                    with open(tmp_dir / f"{i}.{prefix}.bad", 'rb') as f:
+                        f.seek(bad_pos)
+                        _copy_bad_records(f, badfile, line_base)
+                    with open(tmp_dir / f"{i}.{prefix}.raw", 'rb') as f:
+                        f.seek(raw_pos)
+                        shutil.copyfileobj(f, badraw, IO_BUFFER_BYTES)
+                    for ext in ('out', 'bad', 'raw'):
+                        (tmp_dir / f"{i}.{prefix}.{ext}").unlink()
+                valid_count += valid
+                bad_count += bad
+                line_base += result['n_lines']
+                consumed_prev = consumed
+                if progress is not None:
+                    progress.write(PROGRESS_RECORD.pack(valid_count, bad_count, 0))
+                logger.info(f"✅ Кусок {i + 1}/{len(bounds)}: валидных строк всего {valid_count}, "
+                            f"невалидных {bad_count}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return valid_count, bad_count
+
+
 def process_csv_streaming(input_path: Path, output_path: Path, bad_path: Path,
                           encoding: str, delimiter: str, export_delimiter: str = '~',
-                          batch_size: int = 10000, expected_columns=None, bad_raw_path: Path | None = None):
-    """Обрабатывает CSV потоково для экономии памяти."""
+                          batch_size: int = 100_000, expected_columns=None, bad_raw_path: Path | None = None,
+                          progress_path: Path | None = None, workers: int | None = None):
+    """
+    Обрабатывает CSV потоково для экономии памяти.
+    Если задан progress_path, каждые PROGRESS_EVERY строк дописывает в него запись PROGRESS_RECORD.
+    workers — число процессов для больших файлов (None — по числу CPU для файлов от PARALLEL_MIN_BYTES,
+    1 — всегда последовательно). Результат не зависит от числа процессов.
+    """
 
     valid_count = 0
     bad_count = 0
@@ -245,26 +869,39 @@ def process_csv_streaming(input_path: Path, output_path: Path, bad_path: Path,
         # Определим путь для файла сырых ошибок (линии без изменений)
         if bad_raw_path is None:
             bad_raw_path = bad_path.with_name(f"{bad_path.stem}_raw.txt")
-        with open(input_path, 'r', encoding=encoding, errors='ignore', newline='') as infile, \
-                open(output_path, 'w', encoding='utf-8', newline='') as outfile, \
-                open(bad_path, 'w', encoding='utf-8', newline='') as badfile, \
-                open(bad_raw_path, 'w', encoding='utf-8', newline='') as badraw:
+        # Bad-файлы создаются при первой дефектной строке; результаты прошлого запуска
+        # с теми же путями удаляем, чтобы они не выдали себя за текущие
+        bad_path.unlink(missing_ok=True)
+        bad_raw_path.unlink(missing_ok=True)
+        with open(input_path, 'r', encoding=encoding, errors='ignore', newline='',
+                  buffering=IO_BUFFER_BYTES) as infile, \
+                open(output_path, 'wb', buffering=IO_BUFFER_BYTES) as outfile, \
+                ExitStack() as bad_files, \
+                (open(progress_path, 'ab', buffering=0) if progress_path is not None else nullcontext()) as progress:
 
-            # Создаем CSV reader с исходным разделителем
-            reader = csv.reader(infile, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
+            # Файл читается строго последовательно — просим ядро об агрессивном read-ahead
+            if hasattr(os, 'posix_fadvise'):
+                try:
+                    os.posix_fadvise(infile.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                except OSError:
+                    pass
 
-            # Создаем CSV writer с новым разделителем и правильным экранированием
-            writer = csv.writer(outfile, delimiter=export_delimiter, quoting=csv.QUOTE_ALL)
-            bad_writer = csv.writer(badfile, delimiter=export_delimiter, quoting=csv.QUOTE_ALL)
+            # Создаем CSV reader с исходным разделителем; читаем через readline, чтобы после
+            # заголовка работал infile.tell() (нужен для деления тела файла на куски)
+            reader = csv.reader(iter(infile.readline, ''), delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
 
-            # Записываем заголовок в bad файл с описанием колонок
+            # Формат вывода совпадает с csv.writer(delimiter=export_delimiter, quoting=csv.QUOTE_ALL)
+            quoted_sep = '"' + export_delimiter + '"'
+
+            # Заголовок bad файла с описанием колонок запишется вместе с первой дефектной строкой
             bad_header = ['Номер_строки', 'Тип_ошибки', 'Описание_ошибки', 'Содержимое_строки']
-            bad_writer.writerow(bad_header)
+            badfile = _LazyFile(bad_files, bad_path, _quote_all(bad_header, quoted_sep).encode('utf-8'))
+            badraw = _LazyFile(bad_files, bad_raw_path)
 
             # Обрабатываем заголовок
             try:
                 header = next(reader)
-                writer.writerow(header)
+                outfile.write(_quote_all(header, quoted_sep).encode('utf-8'))
                 header_cols = len(header)
                 if expected_columns is None:
                     expected_columns_local = header_cols
@@ -277,106 +914,29 @@ def process_csv_streaming(input_path: Path, output_path: Path, bad_path: Path,
                 logger.error("❌ Файл пустой или не содержит заголовок")
                 return
 
-            # Обрабатываем строки потоково с возможностью склейки двух последовательных строк
-            import io as _io
-
-            def _parse_row(text: str):
-                try:
-                    return next(csv.reader(_io.StringIO(text), delimiter=delimiter, quoting=csv.QUOTE_MINIMAL))
-                except StopIteration:
-                    return []
-                except Exception:
-                    return None
-
-            phys_line_no = 2
-            buffered_line = None
-            while True:
-                try:
-                    if buffered_line is not None:
-                        cur_line = buffered_line
-                        buffered_line = None
-                        from_buffer = True
-                    else:
-                        cur_line = infile.readline()
-                        from_buffer = False
-                    if not cur_line:
-                        break
-
-                    row = _parse_row(cur_line)
-                    if row is not None and len(row) == expected_columns_local:
-                        # Валидная строка — сразу пишем
-                        writer.writerow(row)
-                        valid_count += 1
-                        if valid_count % batch_size == 0:
-                            logger.info(f"✅ Обработано валидных строк: {valid_count}")
-                        phys_line_no += 1
-                        continue
-
-                    # Невалидная — пробуем склеить с одной следующей строкой
-                    next_line = infile.readline()
-                    if next_line:
-                        combined = cur_line.rstrip('\r\n') + next_line.lstrip('\r\n')
-                        combined_row = _parse_row(combined)
-                        if combined_row is not None and len(combined_row) == expected_columns_local:
-                            writer.writerow(combined_row)
-                            valid_count += 1
-                            if valid_count % batch_size == 0:
-                                logger.info(f"✅ Обработано валидных строк: {valid_count}")
-                            # потребили две строки
-                            phys_line_no += 2
-                        else:
-                            # Склейка не помогла — записываем в bad только текущую строку,
-                            # следующую вернём в буфер для самостоятельной обработки
-                            bad_len = (len(row) if row is not None else '—')
-                            content = cur_line.rstrip('\r\n')
-                            if content.strip() == "":
-                                desc = "Пустая строка"
-                            else:
-                                desc = (
-                                    f"Неверное количество столбцов: {bad_len} вместо {expected_columns_local}"
-                                    if isinstance(bad_len,
-                                                  int) else f"Неверная строка (ожидалось {expected_columns_local} столбцов)"
-                                )
-                            bad_writer.writerow([phys_line_no, "Ошибка_структуры", desc, content])
-                            # В файл сырых ошибок пишем строку без изменений
-                            badraw.write(cur_line)
-                            bad_count += 1
-                            if bad_count % 1000 == 0:
-                                logger.warning(f"⚠️ Невалидных строк: {bad_count}")
-                            phys_line_no += 1
-                            buffered_line = next_line
-                    else:
-                        # нет следующей строки — фиксируем текущую как битую
-                        content = cur_line.rstrip('\r\n')
-                        if content.strip() == "":
-                            desc = "Пустая строка"
-                        else:
-                            bad_len = (len(row) if row is not None else '—')
-                            desc = (
-                                f"Неверное количество столбцов: {bad_len} вместо {expected_columns_local}"
-                                if isinstance(bad_len,
-                                              int) else f"Неверная строка (ожидалось {expected_columns_local} столбцов)"
-                            )
-                        bad_writer.writerow([phys_line_no, "Ошибка_структуры", desc, content])
-                        # В файл сырых ошибок пишем строку без изменений
-                        badraw.write(cur_line)
-                        bad_count += 1
-                        if bad_count % 1000 == 0:
-                            logger.warning(f"⚠️ Невалидных строк: {bad_count}")
-                        phys_line_no += 1
+            body_start = infile.tell()
+            body_bytes = input_path.stat().st_size - body_start
+            # tell() — смещение в байтах, только если у декодера после заголовка нет недочитанного
+            # состояния; иначе это метка больше размера файла, и тело читается текстом и последовательно
+            binary = body_bytes >= 0 and _is_passthrough(encoding)
+            n_workers = _parallel_workers(workers, encoding, body_bytes)
+            if n_workers > 1:
+                valid_count, bad_count = _process_parallel(
+                    input_path, outfile, badfile, badraw, encoding, delimiter, quoted_sep,
+                    expected_columns_local, body_start, n_workers, progress=progress, binary=binary)
+            else:
+                readline = infile.readline
+                if binary:
+                    # Тело читаем байтами через тот же дескриптор (с уже выставленным read-ahead)
+                    raw = open(infile.fileno(), 'rb', buffering=0, closefd=False)
+                    raw.seek(body_start)
+                    readline = _Utf8Lines(raw, encoding).readline
+                valid_count, bad_count, _, _, _ = _process_rows(
+                    readline, outfile, badfile, badraw, delimiter, quoted_sep, expected_columns_local,
+                    batch_size=batch_size, bad_log_every=1000, progress=progress, binary=binary)
 
-                except Exception as e:
-                    # Ошибка при обработке
-                    error_desc = f"Ошибка обработки: {str(e)[:100]}"
-                    bad_writer.writerow([phys_line_no, "Ошибка_обработки", error_desc,
-                                         (cur_line.rstrip('\r\n') if 'cur_line' in locals() else '')])
-                    # В файл сырых ошибок пишем исходную строку, если она есть
-                    if 'cur_line' in locals():
-                        badraw.write(cur_line)
-                    bad_count += 1
-                    if bad_count % 1000 == 0:
-                        logger.warning(f"⚠️ Невалидных строк: {bad_count}")
-                    phys_line_no += 1
+            if progress is not None:
+                progress.write(PROGRESS_RECORD.pack(valid_count, bad_count, 1))
 
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}")
@@ -386,6 +946,37 @@ def process_csv_streaming(input_path: Path, output_path: Path, bad_path: Path,
     return valid_count, bad_count
 
 
+def _sniff_cache_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + SNIFF_CACHE_SUFFIX)
+
+
+def _sniff_cache_key(file_path: Path, **params) -> dict:
+    """Ключ кэша: идентичность файла (mtime, размер), версия алгоритма и параметры определения."""
+    st = file_path.stat()
+    return {"version": SNIFF_CACHE_VERSION, "mtime_ns": st.st_mtime_ns, "size": st.st_size, **params}
+
+
+def load_sniff_cache(file_path: Path, key: dict) -> dict | None:
+    """Возвращает сохранённые результаты автоопределения, если ключ совпадает, иначе None."""
+    try:
+        with open(_sniff_cache_path(file_path), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    return cached.get("result")
+
+
+def save_sniff_cache(file_path: Path, key: dict, result: dict) -> None:
+    """Сохраняет результаты автоопределения; каталог только для чтения не считается ошибкой."""
+    try:
+        with open(_sniff_cache_path(file_path), 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "result": result}, f, ensure_ascii=False)
+    except OSError as e:
+        logger.warning(f"⚠️ Не удалось сохранить кэш автоопределения: {e}")
+
+
 def main():
     parser = argparse.ArgumentParser(description='Потоковый CSV парсер для больших файлов с редким разделителем')
     parser.add_argument('input_path', help='Путь к входному CSV файлу')
@@ -396,10 +987,17 @@ def main():
     parser.add_argument('--export_delimiter', default='~', help='Разделитель для выходного файла (по умолчанию: ~)')
     parser.add_argument('--sample_size', type=int, default=10000,
                         help='Размер выборки для определения кодировки')
-    parser.add_argument('--batch_size', type=int, default=10000,
+    parser.add_argument('--batch_size', type=int, default=100_000,
                         help='Размер батча для логирования прогресса')
+    parser.add_argument('--progress_file',
+                        help='Бинарный файл, куда дописываются счётчики прогресса (для UI)')
+    parser.add_argument('--workers', type=int,
+                        help='Число процессов для обработки (по умолчанию — по числу CPU для файлов от 128 MB; 1 — без распараллеливания)')
+    parser.add_argument('--no_sniff_cache', action='store_true',
+                        help=f'Не использовать кэш автоопределения (<файл>{SNIFF_CACHE_SUFFIX})')
 
     args = parser.parse_args()
+    _get_logger()
 
     input_path = Path(args.input_path)
     output_path = Path(args.output_path)
@@ -410,12 +1008,29 @@ def main():
         return
 
     try:
-        # Определяем параметры файла
-        encoding = args.encoding or detect_encoding(input_path, args.sample_size)
-        # Статистический анализ по первым 10000 строкам с приоритетом >1 колонка
-        delim, header_cols, modal_cols, total_rows, modal_share = analyze_csv_stats(
-            input_path, encoding, max_lines=10000, provided_delimiter=args.delimiter
-        )
+        # Определяем параметры файла; для неизменённого файла берём их из кэша
+        cache_key = _sniff_cache_key(input_path, encoding=args.encoding, delimiter=args.delimiter,
+                                     sample_size=args.sample_size, max_lines=10000)
+        cached = None if args.no_sniff_cache else load_sniff_cache(input_path, cache_key)
+        if cached is not None:
+            encoding = cached["encoding"]
+            delim = cached["delimiter"]
+            header_cols = cached["header_cols"]
+            modal_cols = cached["modal_cols"]
+            total_rows = cached["total_rows"]
+            modal_share = cached["modal_share"]
+            logger.info(f"♻️ Параметры файла взяты из кэша {_sniff_cache_path(input_path).name}")
+        else:
+            encoding = args.encoding or detect_encoding(input_path, args.sample_size)
+            # Статистический анализ по первым 10000 строкам с приоритетом >1 колонка
+            delim, header_cols, modal_cols, total_rows, modal_share = analyze_csv_stats(
+                input_path, encoding, max_lines=10000, provided_delimiter=args.delimiter
+            )
+            if not args.no_sniff_cache:
+                save_sniff_cache(input_path, cache_key, {
+                    "encoding": encoding, "delimiter": delim, "header_cols": header_cols,
+                    "modal_cols": modal_cols, "total_rows": total_rows, "modal_share": modal_share,
+                })
         export_delimiter = args.export_delimiter
 
         logger.info(f"🔍 Параметры: encoding={encoding}, входной разделитель={repr(delim)}")
@@ -434,12 +1049,17 @@ def main():
         # Обрабатываем CSV
         valid_count, bad_count = process_csv_streaming(
             input_path, output_path, bad_path, encoding, delim, export_delimiter, args.batch_size,
-            expected_columns=expected_columns
+            expected_columns=expected_columns,
+            progress_path=Path(args.progress_file) if args.progress_file else None,
+            workers=args.workers,
         )
 
         # Выведем краткую сводку в stdout в стабильном формате для UI
+        # Консольный лог пишет фоновый поток в тот же пайп: без сброса очереди строка сводки
+        # может перемешаться с его строками, а UI разбирает её целиком
         try:
-            print(f"__SUMMARY__ VALID={valid_count} BAD={bad_count}")
+            _flush_logger()
+            print(f"__SUMMARY__ VALID={valid_count} BAD={bad_count}", flush=True)
         except Exception:
             pass
         logger.info("✅ Обработка CSV завершена успешно!")
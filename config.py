@@ -10,10 +10,14 @@
     DATA_DIR=./data
     EXPORT_DIR=./export
     BAD_DIR=./bad
-- Папки автоматически создаются при импорте этого модуля.
+- Папки создаются лениво — при первом обращении к соответствующему пути, а не при импорте.
 
 Использование:
-    from config import DATA_DIR, EXPORT_DIR, BAD_DIR
+    from config import DIRS
+    DIRS.data, DIRS.export, DIRS.bad, DIRS.logs
+
+Для совместимости доступны и прежние имена: from config import DATA_DIR, EXPORT_DIR, BAD_DIR, LOGS_DIR
+(каталог создаётся в момент импорта имени).
 
 Формат значений в .env может быть абсолютным или относительным. Относительные
 пути интерпретируются относительно корня проекта (директория этого файла).
@@ -21,6 +25,7 @@
 from __future__ import annotations
 
 import os
+from functools import cached_property
 from pathlib import Path
 
 try:
@@ -47,18 +52,47 @@ def _resolve_path(value: str | os.PathLike | None, default_rel: str) -> Path:
     return (PROJECT_ROOT / default_rel).resolve()
 
 
-DATA_DIR: Path = _resolve_path(os.getenv('DATA_DIR'), 'data')
-EXPORT_DIR: Path = _resolve_path(os.getenv('EXPORT_DIR'), 'export')
-BAD_DIR: Path = _resolve_path(os.getenv('BAD_DIR'), 'bad')
-LOGS_DIR: Path = _resolve_path(os.getenv('LOGS_DIR'), 'logs')
-
-# Гарантируем, что директории существуют
-for _d in (DATA_DIR, EXPORT_DIR, BAD_DIR, LOGS_DIR):
+def _ensure_dir(p: Path) -> Path:
+    """Создаёт каталог (с родителями), если его нет, и возвращает его."""
     try:
-        _d.mkdir(parents=True, exist_ok=True)
+        p.mkdir(parents=True, exist_ok=True)
     except Exception:
-        # Не прерываем импорт конфигурации из-за проблем с правами,
+        # Не прерываем работу из-за проблем с правами,
         # но оставляем возможность обработать это на уровне приложения
         pass
+    return p
+
+
+class _Dirs:
+    """Каталоги проекта: путь вычисляется и каталог создаётся при первом обращении, далее — из кэша."""
+
+    @cached_property
+    def data(self) -> Path:
+        return _ensure_dir(_resolve_path(os.getenv('DATA_DIR'), 'data'))
+
+    @cached_property
+    def export(self) -> Path:
+        return _ensure_dir(_resolve_path(os.getenv('EXPORT_DIR'), 'export'))
+
+    @cached_property
+    def bad(self) -> Path:
+        return _ensure_dir(_resolve_path(os.getenv('BAD_DIR'), 'bad'))
+
+    @cached_property
+    def logs(self) -> Path:
+        return _ensure_dir(_resolve_path(os.getenv('LOGS_DIR'), 'logs'))
+
+
+DIRS = _Dirs()
+
+# Прежние константы модуля -> атрибуты DIRS
+_LEGACY_NAMES = {'DATA_DIR': 'data', 'EXPORT_DIR': 'export', 'BAD_DIR': 'bad', 'LOGS_DIR': 'logs'}
+
+
+def __getattr__(name: str) -> Path:
+    if name in _LEGACY_NAMES:
+        return getattr(DIRS, _LEGACY_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-__all__ = ['PROJECT_ROOT', 'DATA_DIR', 'EXPORT_DIR', 'BAD_DIR', 'LOGS_DIR']
+__all__ = ['PROJECT_ROOT', 'DIRS', 'DATA_DIR', 'EXPORT_DIR', 'BAD_DIR', 'LOGS_DIR']
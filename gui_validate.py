@@ -7,60 +7,169 @@ app_streamlit
 файла, подсчёт строк для прогресса и запуск внешнего CLI-скрипта (streaming_csv_parser.py)
 через subprocess с разбором stdout для обновления прогресса.
 
-Артефакты раскладываются по каталогам из config.py (DATA_DIR/EXPORT_DIR/BAD_DIR/LOGS_DIR).
+Артефакты раскладываются по каталогам из config.py (DIRS.data/export/bad/logs).
 См. README.md для подробностей.
 """
 
 import io
 import os
+import atexit
 import csv
+import mmap
 import time
 import sys
 import shutil
 import subprocess
+import itertools
+import queue
+import threading
+from collections import Counter, deque
 from pathlib import Path
 from typing import Tuple, Optional, List
 
-import chardet
+import numpy as np
 import streamlit as st
 from datetime import datetime
 import uuid
-from config import EXPORT_DIR, BAD_DIR, DATA_DIR, LOGS_DIR
+import weakref
+from config import DIRS
+from cli_validate import PROGRESS_RECORD
+
+try:
+    # faust-cchardet — C++-реализация с тем же API, в разы быстрее чистого chardet
+    import cchardet as chardet  # type: ignore
+except Exception:  # библиотека может быть не установлена — используем chardet
+    import chardet
 
 SAMPLE_BYTES = 100_000
+ENCODING_CHUNK_BYTES = 16 * 1024
+ENCODING_MAX_BYTES = 1024 * 1024
+WRITE_BUFFER_BYTES = 1024 * 1024
+IN_MEMORY_MAX_BYTES = 50 * 1024 * 1024
+UI_REFRESH_SECONDS = 0.1
+# Период автообновления вкладки логов (перезапускается только фрагмент с логами, не весь скрипт)
+LOGS_REFRESH_SECONDS = 5
+LOG_TAIL_BYTES = 512 * 1024
+LOG_BUFFER_BYTES = 64 * 1024
+PIPE_BUFFER_BYTES = 1024 * 1024
+PIPE_READ_BYTES = 64 * 1024
+COPY_CHUNK_BYTES = 16 * 1024 * 1024
+EXACT_COUNT_MAX_BYTES = 200 * 1024 * 1024
+LINE_ESTIMATE_SAMPLE_BYTES = 8 * 1024 * 1024
 
 
 def get_session_log_path() -> Path:
     if 'log_path' not in st.session_state:
-        LOGS_DIR.mkdir(exist_ok=True)
         sid = st.session_state.get('_session_id') or str(uuid.uuid4())[:8]
         st.session_state['_session_id'] = sid
         fname = f"session_{sid}_{int(time.time())}.log"
-        st.session_state['log_path'] = LOGS_DIR / fname
+        st.session_state['log_path'] = DIRS.logs / fname
     return st.session_state['log_path']
 
 
-def write_log(msg: str) -> None:
-    path = get_session_log_path()
+@st.cache_resource
+def _open_log_handles() -> weakref.WeakSet:
+    """
+    Открытые логи всех сессий — один набор на процесс сервера. Ссылки слабые: файл закрывается
+    вместе с состоянием своей сессии, а оставшиеся при остановке сервера закрывает один atexit-хук.
+    """
+    handles = weakref.WeakSet()
+    atexit.register(lambda: [fh.close() for fh in list(handles)])
+    return handles
+
+
+def _get_log_handle():
+    """Открытый на всю сессию буферизованный файл лога (вместо open/close на каждую строку)."""
+    fh = st.session_state.get('_log_fh')
+    if fh is None or fh.closed:
+        fh = open(get_session_log_path(), 'ab', buffering=LOG_BUFFER_BYTES)
+        st.session_state['_log_fh'] = fh
+        _open_log_handles().add(fh)
+    return fh
+
+
+def write_log(msg: str | bytes) -> None:
+    """Строка в лог сессии; bytes (вывод CLI в UTF-8) пишутся без перекодирования."""
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
-        with path.open('a', encoding='utf-8') as f:
-            f.write(f"{ts} {msg}\n")
+        if isinstance(msg, str):
+            msg = msg.encode('utf-8')
+        _get_log_handle().write(f"{ts} ".encode('ascii') + msg + b"\n")
     except Exception:
         pass
 
 
+def flush_log() -> None:
+    """Сбросить буфер лога сессии на диск, чтобы его хвост был виден при чтении."""
+    fh = st.session_state.get('_log_fh')
+    if fh is not None and not fh.closed:
+        try:
+            fh.flush()
+        except Exception:
+            pass
+
+
 # --------- Core helpers ---------
 
+class _FilenameTable(dict):
+    """
+    Translation table for str.translate: alphanumerics and '-_. ' are kept, everything
+    else becomes '_'. Codepoints are classified on first use and cached, so repeated
+    lookups stay inside the C-level translate loop.
+    """
+
+    def __missing__(self, codepoint: int):
+        ch = chr(codepoint)
+        value = codepoint if ch.isalnum() or ch in ('-', '_', '.', ' ') else '_'
+        self[codepoint] = value
+        return value
+
+
+_FILENAME_TABLE = _FilenameTable()
+
+
 def sanitize_filename(name: str) -> str:
     name = os.path.basename(name or "uploaded.csv")
     # Replace risky characters
-    safe = ''.join(c if c.isalnum() or c in ('-', '_', '.', ' ') else '_' for c in name)
+    safe = name.translate(_FILENAME_TABLE)
     if not safe.strip():
         safe = 'uploaded.csv'
     return safe
 
 
+def _kernel_copy(src, out) -> bool:
+    """
+    Copy the whole src file into out inside the kernel (copy_file_range/sendfile),
+    without passing bytes through Python buffers. Returns False when src has no real
+    file descriptor or the platform does not support it, so the caller can fall back.
+    """
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    if copy_file_range is None and sendfile is None:
+        return False
+    try:
+        src_fd = src.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    out_fd = out.fileno()
+    size = os.fstat(src_fd).st_size
+    offset = 0
+    try:
+        while offset < size:
+            if copy_file_range is not None:
+                n = copy_file_range(src_fd, out_fd, size - offset, offset)
+            else:
+                n = sendfile(out_fd, src_fd, offset, size - offset)
+            if n == 0:
+                break
+            offset += n
+    except OSError:
+        if offset == 0:
+            return False
+        raise
+    return True
+
+
 def save_uploaded_to_disk(uploaded_file, target_dir: Path) -> Path:
     """Save the uploaded file to target_dir streaming in chunks. Returns saved path."""
     target_dir.mkdir(parents=True, exist_ok=True)
@@ -74,17 +183,18 @@ def save_uploaded_to_disk(uploaded_file, target_dir: Path) -> Path:
     except Exception:
         pass
     with open(out_path, 'wb') as out:
-        # stream copy in chunks of 8MB
-        try:
-            shutil.copyfileobj(uploaded_file, out, length=8 * 1024 * 1024)
-        except Exception:
-            # some UploadedFile objects require reading in manual chunks
-            uploaded_file.seek(0)
-            while True:
-                chunk = uploaded_file.read(8 * 1024 * 1024)
-                if not chunk:
-                    break
-                out.write(chunk)
+        if not _kernel_copy(uploaded_file, out):
+            # stream copy in chunks of 16MB
+            try:
+                shutil.copyfileobj(uploaded_file, out, length=COPY_CHUNK_BYTES)
+            except Exception:
+                # some UploadedFile objects require reading in manual chunks
+                uploaded_file.seek(0)
+                while True:
+                    chunk = uploaded_file.read(COPY_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    out.write(chunk)
     try:
         uploaded_file.seek(0)
     except Exception:
@@ -104,24 +214,17 @@ def read_first_n_lines_bytes(file_like, n: int = 10000, chunk_size: int = 1024 *
         chunk = file_like.read(chunk_size)
         if not chunk:
             break
-        chunks.append(chunk)
-        lines_seen += chunk.count(b'\n')
-        if lines_seen >= n:
+        in_chunk = chunk.count(b'\n')
+        if lines_seen + in_chunk >= n:
+            # Trim this chunk at the nth newline so the join copies only the bytes we return
+            idx = 0
+            for _ in range(n - lines_seen):
+                idx = chunk.find(b'\n', idx) + 1
+            chunks.append(chunk[:idx] if idx > 0 else chunk)
             break
-    data = b''.join(chunks)
-    # Trim to the position of the nth newline to avoid reading beyond n lines
-    if lines_seen >= n:
-        # find index of nth newline
-        count = 0
-        idx = -1
-        for i, b in enumerate(data):
-            if b == 0x0A:  # '\n'
-                count += 1
-                if count == n:
-                    idx = i + 1
-                    break
-        if idx != -1:
-            data = data[:idx]
+        chunks.append(chunk)
+        lines_seen += in_chunk
+    data = chunks[0] if len(chunks) == 1 else b''.join(chunks)
     try:
         file_like.seek(0)
     except Exception:
@@ -130,23 +233,74 @@ def read_first_n_lines_bytes(file_like, n: int = 10000, chunk_size: int = 1024 *
 
 
 def detect_encoding_and_reset(file_obj) -> str:
+    """
+    Определяет кодировку, подавая в детектор блоки по ENCODING_CHUNK_BYTES.
+    Останавливается, как только детектор уверен (detector.done). Если первые
+    SAMPLE_BYTES состоят только из ASCII, окно расширяется до ENCODING_MAX_BYTES,
+    чтобы не пропустить не-ASCII символы дальше по файлу.
+    """
     pos = file_obj.tell()
-    head = file_obj.read(SAMPLE_BYTES)
+    head = file_obj.read(ENCODING_CHUNK_BYTES)
     if isinstance(head, str):
         # already text
         file_obj.seek(pos)
         return 'utf-8'
-    detector = chardet.detect(head)
-    if detector["confidence"] < 0.7:
+    detector = chardet.UniversalDetector()
+    seen = 0
+    only_ascii = True
+    limit = SAMPLE_BYTES
+    while head:
+        detector.feed(head)
+        seen += len(head)
+        only_ascii = only_ascii and head.isascii()
+        if detector.done:
+            break
+        if seen >= limit:
+            if not only_ascii or limit >= ENCODING_MAX_BYTES:
+                break
+            limit = ENCODING_MAX_BYTES
+        head = file_obj.read(ENCODING_CHUNK_BYTES)
+    detector.close()
+    result = detector.result or {}
+    # cchardet возвращает confidence=None, если кодировку определить не удалось
+    if (result.get("confidence") or 0.0) < 0.7:
         enc = "utf-8"
     else:
-        enc = detector["encoding"]
-    if enc and enc.lower() == 'ascii':
+        enc = result.get("encoding") or "utf-8"
+    if enc.lower() == 'ascii':
         enc = 'utf-8'
     file_obj.seek(0)
     return enc
 
 
+def _file_state_key(kind: str, path: Path) -> Optional[str]:
+    """Ключ session_state для кэша по файлу: меняется вместе с mtime/размером файла."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return f"_{kind}_{path}_{stat.st_mtime_ns}_{stat.st_size}"
+
+
+def detect_file_encoding(path: Path, sample: Optional[bytes] = None) -> str:
+    """
+    Кодировка файла на диске; результат кэшируется в session_state по (path, mtime).
+    Если передан sample (уже прочитанное начало файла), детектор работает по нему без чтения с диска.
+    """
+    key = _file_state_key('enc', path)
+    if key is None:
+        return 'utf-8'
+    enc = st.session_state.get(key)
+    if enc is None:
+        if sample is not None:
+            enc = detect_encoding_and_reset(io.BytesIO(sample))
+        else:
+            with open(path, 'rb') as f:
+                enc = detect_encoding_and_reset(f)
+        st.session_state[key] = enc
+    return enc
+
+
 def detect_input_delimiter(text_stream, max_lines: int = 30) -> str:
     pos = text_stream.tell()
     lines = [text_stream.readline() for _ in range(max_lines)]
@@ -163,6 +317,29 @@ def detect_input_delimiter(text_stream, max_lines: int = 30) -> str:
         return max(counts, key=counts.get)
 
 
+def _modal(values: List[int]) -> Tuple[int, int]:
+    """Модальное значение и число его вхождений (при равенстве частот — большее значение)."""
+    if len(values) < 32:
+        cnt = Counter(values)
+        return max(cnt.items(), key=lambda kv: (kv[1], kv[0]))
+    # Значения — небольшие неотрицательные числа: гистограмма bincount вместо словаря
+    hist = np.bincount(np.fromiter(values, dtype=np.int32, count=len(values)))
+    # argmax по развёрнутой гистограмме — чтобы при равенстве выбрать большее значение
+    modal = len(hist) - 1 - int(hist[::-1].argmax())
+    return modal, int(hist[modal])
+
+
+def _column_stats(sample_text: str, delimiter: str) -> Optional[Tuple[int, int, int]]:
+    """Разбирает сэмпл csv.reader'ом: (header_cols, modal_cols, total_rows) или None, если строк нет."""
+    reader = csv.reader(io.StringIO(sample_text), delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
+    lengths = [len(row) for row in reader]
+    if not lengths:
+        return None
+    header_cols = lengths[0]
+    modal_cols = _modal(lengths[1:])[0] if len(lengths) > 1 else header_cols
+    return header_cols, modal_cols, len(lengths)
+
+
 def analyze_csv_stats_stream(text_stream, max_lines: int = 10000, provided_delimiter: Optional[str] = None):
     """
     Анализирует первые max_lines строк потока для определения оптимального разделителя
@@ -170,9 +347,10 @@ def analyze_csv_stats_stream(text_stream, max_lines: int = 10000, provided_delim
     Бросает ValueError при ошибках.
     Улучшения:
     - Добавлен кандидат из csv.Sniffer().
+    - Кандидаты оцениваются по числу вхождений разделителя в строке (line.count), а csv.reader
+      запускается только для победителя, чтобы точно посчитать колонки.
     - Если все кандидаты дают 1 колонку, используем частотный фоллбек по среднему числу вхождений разделителя.
     """
-    import io as _io
     pos = text_stream.tell()
     try:
         lines = []
@@ -199,69 +377,87 @@ def analyze_csv_stats_stream(text_stream, max_lines: int = 10000, provided_delim
             if d not in candidates:
                 candidates.append(d)
 
-        best = None  # (score, delimiter, header_cols, modal_cols, total_rows, modal_count)
+        # Оценка кандидатов: мода числа вхождений разделителя в строках данных и её доля
+        ranked = []  # (rank, delimiter), rank = (score, modal_count, modal_seps)
         freq_counts = {}
-        sample_text = ''.join(lines)
         for d in candidates:
+            counts = [line.count(d) for line in lines]
+            freq_counts[d] = sum(counts) / len(lines)
+            data_counts = counts[1:]
+            if data_counts:
+                modal_seps, modal_count = _modal(data_counts)
+                score = modal_count / len(data_counts)
+            else:
+                modal_seps, modal_count, score = counts[0], 0, 1.0
+            ranked.append(((score, modal_count, modal_seps), d))
+        # Сортировка устойчива: при равных оценках сохраняется порядок кандидатов
+        ranked.sort(key=lambda r: r[0], reverse=True)
+
+        sample_text = ''.join(lines)
+        best = None  # (delimiter, header_cols, modal_cols, total_rows)
+        for _rank, d in ranked:
             try:
-                freq_counts[d] = sum(line.count(d) for line in lines) / max(1, len(lines))
-                reader = csv.reader(_io.StringIO(sample_text), delimiter=d, quoting=csv.QUOTE_MINIMAL)
-                lengths = [len(row) for row in reader]
-                if not lengths:
-                    continue
-                header_cols = lengths[0]
-                data_lengths = lengths[1:] if len(lengths) > 1 else []
-                if data_lengths:
-                    from collections import Counter
-                    cnt = Counter(data_lengths)
-                    modal_cols, modal_count = max(cnt.items(), key=lambda kv: (kv[1], kv[0]))
-                else:
-                    modal_cols, modal_count = header_cols, 0
-                total_rows = len(lengths)
-                score = (modal_count / max(1, len(data_lengths))) if data_lengths else 1.0
-                rank = (score, modal_count, modal_cols)
-                if (best is None) or (rank > (best[0], best[5], best[3])):
-                    best = (score, d, header_cols, modal_cols, total_rows, modal_count)
+                stats = _column_stats(sample_text, d)
             except Exception:
                 continue
+            if stats is not None:
+                best = (d, *stats)
+                break
         if best is None:
             d = provided_delimiter or ','
-            reader = csv.reader(_io.StringIO(sample_text), delimiter=d, quoting=csv.QUOTE_MINIMAL)
-            lengths = [len(row) for row in reader]
-            if not lengths:
+            stats = _column_stats(sample_text, d)
+            if stats is None:
                 raise ValueError("Не удалось разобрать первые строки файла")
-            header_cols = lengths[0]
-            data_lengths = lengths[1:] if len(lengths) > 1 else []
-            if data_lengths:
-                from collections import Counter
-                cnt = Counter(data_lengths)
-                modal_cols = max(cnt, key=cnt.get)
-            else:
-                modal_cols = header_cols
-            return d, header_cols, modal_cols, len(lengths)
+            return (d, *stats)
 
-        score, delimiter, header_cols, modal_cols, total_rows, modal_count = best
+        delimiter, header_cols, modal_cols, total_rows = best
         if modal_cols == 1 and freq_counts:
             # Фоллбек: выберем разделитель с наибольшей средней частотой
             best_d = max(freq_counts.items(), key=lambda kv: kv[1])[0]
-            reader = csv.reader(_io.StringIO(sample_text), delimiter=best_d, quoting=csv.QUOTE_MINIMAL)
-            lengths = [len(row) for row in reader]
-            if lengths:
-                header_cols = lengths[0]
-                data_lengths = lengths[1:] if len(lengths) > 1 else []
-                if data_lengths:
-                    from collections import Counter
-                    cnt = Counter(data_lengths)
-                    modal_cols = max(cnt, key=cnt.get)
-                else:
-                    modal_cols = header_cols
-                total_rows = len(lengths)
+            stats = _column_stats(sample_text, best_d)
+            if stats is not None:
+                header_cols, modal_cols, total_rows = stats
                 delimiter = best_d
         return delimiter, header_cols, modal_cols, total_rows
     finally:
         text_stream.seek(pos)
 
 
+def _stream_size(bin_file) -> int:
+    """Размер бинарного потока: fstat для настоящих файлов, seek/tell для BytesIO и т.п."""
+    try:
+        return os.fstat(bin_file.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pos = bin_file.tell()
+        size = bin_file.seek(0, io.SEEK_END)
+        bin_file.seek(pos)
+        return size
+
+
+def analyze_file_stats_cached(path: Path, encoding: str, max_lines: int = 10000,
+                              provided_delimiter: Optional[str] = None, sample: Optional[bytes] = None):
+    """
+    analyze_csv_stats_stream по первым max_lines строкам файла на диске.
+    Результат кэшируется в session_state по (path, mtime, size, encoding, provided_delimiter),
+    поэтому повторные перерисовки страницы не повторяют анализ. Если передан sample
+    (первые max_lines строк файла), файл повторно не читается.
+    """
+    key = _file_state_key('stats', path)
+    if key is not None:
+        key = f"{key}_{encoding}_{max_lines}_{provided_delimiter!r}"
+        stats = st.session_state.get(key)
+        if stats is not None:
+            return stats
+    if sample is None:
+        with open(path, 'rb') as f:
+            sample = read_first_n_lines_bytes(f, n=max_lines)
+    text_stream = io.TextIOWrapper(io.BytesIO(sample), encoding=encoding, errors='ignore', newline='')
+    stats = analyze_csv_stats_stream(text_stream, max_lines=max_lines, provided_delimiter=provided_delimiter)
+    if key is not None:
+        st.session_state[key] = stats
+    return stats
+
+
 def process_csv_stream(
         bin_file,
         export_delimiter: str,
@@ -269,6 +465,59 @@ def process_csv_stream(
         input_delimiter: Optional[str] = None,
         progress_callback=None,
 ) -> Tuple[io.BytesIO, io.BytesIO, io.BytesIO, int, int, int]:
+    """
+    Обработка в памяти: результаты возвращаются как BytesIO. Только для файлов
+    до IN_MEMORY_MAX_BYTES — большие файлы обрабатывайте через process_csv_to_files.
+    """
+    size = _stream_size(bin_file)
+    if size > IN_MEMORY_MAX_BYTES:
+        raise ValueError(
+            f"Файл слишком большой для обработки в памяти ({size / (1024 * 1024):.1f} MB), "
+            f"используйте process_csv_to_files"
+        )
+    clean_buf = io.StringIO()
+    bad_buf = io.StringIO()
+    bad_raw_buf = io.StringIO()
+    valid_count, bad_count, total_count = _process_csv_into(
+        bin_file, clean_buf, bad_buf, bad_raw_buf, export_delimiter,
+        input_encoding, input_delimiter, progress_callback,
+    )
+    clean_bytes = io.BytesIO(clean_buf.getvalue().encode('utf-8'))
+    bad_bytes = io.BytesIO(bad_buf.getvalue().encode('utf-8'))
+    bad_raw_bytes = io.BytesIO(bad_raw_buf.getvalue().encode('utf-8'))
+    return clean_bytes, bad_bytes, bad_raw_bytes, valid_count, bad_count, total_count
+
+
+def process_csv_to_files(
+        bin_file,
+        clean_path: Path,
+        bad_path: Path,
+        bad_raw_path: Path,
+        export_delimiter: str,
+        input_encoding: Optional[str] = None,
+        input_delimiter: Optional[str] = None,
+        progress_callback=None,
+) -> Tuple[int, int, int]:
+    """Потоковая обработка с записью результатов сразу на диск. Возвращает (valid, bad, total)."""
+    with open(clean_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_BYTES) as clean_out, \
+            open(bad_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_BYTES) as bad_out, \
+            open(bad_raw_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_BYTES) as bad_raw_out:
+        return _process_csv_into(
+            bin_file, clean_out, bad_out, bad_raw_out, export_delimiter,
+            input_encoding, input_delimiter, progress_callback,
+        )
+
+
+def _process_csv_into(
+        bin_file,
+        clean_buf,
+        bad_buf,
+        bad_raw_buf,
+        export_delimiter: str,
+        input_encoding: Optional[str] = None,
+        input_delimiter: Optional[str] = None,
+        progress_callback=None,
+) -> Tuple[int, int, int]:
     # Detect encoding
     encoding = input_encoding or detect_encoding_and_reset(bin_file)
     text_stream = io.TextIOWrapper(bin_file, encoding=encoding, errors='ignore', newline='')
@@ -286,10 +535,6 @@ def process_csv_stream(
     text_stream.seek(0)
 
     # Prepare writers
-    clean_buf = io.StringIO()
-    bad_buf = io.StringIO()
-    bad_raw_buf = io.StringIO()
-
     clean_writer = csv.writer(clean_buf, delimiter=export_delimiter, quoting=csv.QUOTE_ALL)
     bad_writer = csv.writer(bad_buf, delimiter=export_delimiter, quoting=csv.QUOTE_ALL)
 
@@ -310,23 +555,40 @@ def process_csv_stream(
         total_count += 1
     except StopIteration:
         # пустой файл
-        clean_bytes = io.BytesIO(clean_buf.getvalue().encode('utf-8'))
-        bad_bytes = io.BytesIO(bad_buf.getvalue().encode('utf-8'))
-        bad_raw_bytes = io.BytesIO(bad_raw_buf.getvalue().encode('utf-8'))
-        return clean_bytes, bad_bytes, bad_raw_bytes, valid_count, bad_count, total_count
+        return valid_count, bad_count, total_count
 
     # После заголовка переходим на построчную обработку с возможностью склейки 2 строк
-    import io as _io
+    expected_seps = expected_columns - 1
+    # Локальные ссылки вместо поиска атрибутов модуля csv на каждой строке
+    _reader = csv.reader
+    _QM = csv.QUOTE_MINIMAL
+    # split совпадает с csv.reader, только пока строка короче лимита поля (на длинном поле reader падает)
+    field_limit = csv.field_size_limit()
 
     def _parse_row(text: str) -> Optional[List[str]]:
+        # Быстрый путь: строка без кавычек с нужным числом разделителей разбирается split'ом
+        line = text.rstrip('\r\n')
+        if line and '"' not in line and len(line) < field_limit and line.count(det_delim) == expected_seps:
+            return line.split(det_delim)
         try:
-            r = next(csv.reader(_io.StringIO(text), delimiter=det_delim, quoting=csv.QUOTE_MINIMAL))
+            # csv.reader по списку из одной строки — без создания StringIO на каждую строку
+            r = next(_reader([text], delimiter=det_delim, quoting=_QM))
             return r
         except StopIteration:
             return []
         except Exception:
             return None
 
+    # Горячий цикл выполняется на каждую строку: связываем методы с локальными
+    # именами, чтобы не искать атрибуты объектов на каждой итерации
+    readline = text_stream.readline
+    write_clean = clean_writer.writerow
+    write_bad = bad_writer.writerow
+    write_bad_raw = bad_raw_buf.write
+    write_clean_line = clean_buf.write
+    # Для строк без кавычек QUOTE_ALL сводится к замене разделителя на '"~"'
+    quoted_sep = '"' + export_delimiter + '"'
+
     # Номер физической строки (после заголовка начинаем с 2)
     phys_line_no = 2
     buffered_line = None  # сюда кладём следующую строку, если склейка не удалась
@@ -337,29 +599,37 @@ def process_csv_stream(
             buffered_line = None
             from_buffer = True
         else:
-            cur_line = text_stream.readline()
+            cur_line = readline()
             from_buffer = False
         if not cur_line:
             break
         if not from_buffer:
             total_count += 1  # считаем только реально прочитанные строки
 
-        row = _parse_row(cur_line)
-        if row is not None and len(row) == expected_columns:
+        # Быстрый путь: строка без кавычек с нужным числом разделителей пишется
+        # сразу в формате QUOTE_ALL, минуя csv.reader и csv.writer
+        line = cur_line.rstrip('\r\n')
+        fast = line and '"' not in line and len(line) < field_limit and line.count(det_delim) == expected_seps
+        row = None if fast else _parse_row(cur_line)
+        if fast:
+            write_clean_line('"' + line.replace(det_delim, quoted_sep) + '"\r\n')
+            valid_count += 1
+            phys_line_no += 1
+        elif row is not None and len(row) == expected_columns:
             # Валидная строка — сразу записываем
-            clean_writer.writerow(row)
+            write_clean(row)
             valid_count += 1
             phys_line_no += 1
         else:
             # Невалидная — пробуем склеить ровно с одной следующей строкой
-            next_line = text_stream.readline()
+            next_line = readline()
             if next_line:
                 total_count += 1
                 combined = cur_line.rstrip('\r\n') + next_line.lstrip('\r\n')
                 combined_row = _parse_row(combined)
                 if combined_row is not None and len(combined_row) == expected_columns:
                     # Склейка удалась — считаем валидной записью и потребляем обе строки
-                    clean_writer.writerow(combined_row)
+                    write_clean(combined_row)
                     valid_count += 1
                     phys_line_no += 2
                 else:
@@ -375,9 +645,9 @@ def process_csv_stream(
                         desc = f"Неверное количество столбцов: {bad_len} вместо {expected_columns}"
                     else:
                         desc = f"Неверное количество столбцов: {bad_len} вместо {expected_columns}"
-                    bad_writer.writerow([phys_line_no, "Ошибка_структуры", desc, content])
+                    write_bad([phys_line_no, "Ошибка_структуры", desc, content])
                     # В файл сырых ошибок пишем строку без изменений
-                    bad_raw_buf.write(cur_line)
+                    write_bad_raw(cur_line)
                     bad_count += 1
                     phys_line_no += 1
                     buffered_line = next_line  # вернём следующую строку на повторную обработку
@@ -392,19 +662,16 @@ def process_csv_stream(
                         f"Неверное количество столбцов: {bad_len} вместо {expected_columns}"
                         if isinstance(bad_len, int) else f"Неверная строка (ожидалось {expected_columns} столбцов)"
                     )
-                bad_writer.writerow([phys_line_no, "Ошибка_структуры", desc, content])
+                write_bad([phys_line_no, "Ошибка_структуры", desc, content])
                 # В файл сырых ошибок пишем строку без изменений
-                bad_raw_buf.write(cur_line)
+                write_bad_raw(cur_line)
                 bad_count += 1
                 phys_line_no += 1
 
         if progress_callback and (valid_count + bad_count) % 5000 == 0:
             progress_callback(valid_count, bad_count, total_count)
 
-    clean_bytes = io.BytesIO(clean_buf.getvalue().encode('utf-8'))
-    bad_bytes = io.BytesIO(bad_buf.getvalue().encode('utf-8'))
-    bad_raw_bytes = io.BytesIO(bad_raw_buf.getvalue().encode('utf-8'))
-    return clean_bytes, bad_bytes, bad_raw_bytes, valid_count, bad_count, total_count
+    return valid_count, bad_count, total_count
 
 
 def preview_first_rows(bin_bytes: bytes, encoding: Optional[str] = None, delimiter: Optional[str] = None,
@@ -429,32 +696,106 @@ def preview_first_rows(bin_bytes: bytes, encoding: Optional[str] = None, delimit
     return header, rows, enc, delim
 
 
+def read_progress(progress_file) -> Optional[Tuple[int, int, int]]:
+    """Последняя полная запись (valid, bad, phase) из бинарного файла прогресса CLI или None."""
+    last = os.fstat(progress_file.fileno()).st_size // PROGRESS_RECORD.size - 1
+    if last < 0:
+        return None
+    progress_file.seek(last * PROGRESS_RECORD.size)
+    return PROGRESS_RECORD.unpack(progress_file.read(PROGRESS_RECORD.size))
+
+
+def pump_output(stream, chunks: queue.Queue) -> None:
+    """
+    Фоновый поток: блоки stdout процесса в очередь, b'' — конец вывода. read1 блокируется до записи
+    в пайп, поэтому читаем не в цикле UI — тот опрашивает файл прогресса по своему таймеру.
+    """
+    try:
+        while chunk := stream.read1(PIPE_READ_BYTES):
+            chunks.put(chunk)
+    except (OSError, ValueError):
+        pass
+    finally:
+        chunks.put(b"")
+
+
 def read_log_tail(path: Path, max_lines: int = 500) -> str:
     if not path.exists():
         return "Лог-файл пока не создан. Запустите обработку или скрипт для появления логов."
     try:
-        with path.open('r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-        return ''.join(lines[-max_lines:])
+        # Читаем хвост файла блоками с конца, пока не наберётся больше max_lines строк
+        # (первая строка окна может быть обрезана); блок удваивается, уже прочитанное
+        # повторно не читается
+        with path.open('rb') as f:
+            start = f.seek(0, io.SEEK_END)
+            block = LOG_TAIL_BYTES
+            blocks: list[bytes] = []
+            newlines = 0
+            while start > 0 and newlines <= max_lines:
+                end = start
+                start = max(0, end - block)
+                f.seek(start)
+                data = f.read(end - start)
+                blocks.append(data)
+                newlines += data.count(b'\n')
+                block *= 2
+        lines = b''.join(reversed(blocks)).splitlines(keepends=True)
+        return b''.join(lines[-max_lines:]).decode('utf-8', errors='ignore')
     except Exception as e:
         return f"Не удалось прочитать логи: {e}"
 
 
-def count_total_lines(path: Path, chunk_size: int = 8 * 1024 * 1024) -> int:
-    """Подсчитать количество строк в файле поточно (без загрузки в память)."""
+def count_total_lines(path: Path, chunk_size: int = 64 * 1024 * 1024) -> int:
+    """Подсчитать количество строк в файле через mmap и numpy (без загрузки в память)."""
     try:
         total = 0
         with open(path, 'rb') as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                total += chunk.count(b'\n')
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = np.frombuffer(mm, dtype=np.uint8)
+                # Срезами по chunk_size, чтобы маска сравнения не занимала размер всего файла
+                for start in range(0, size, chunk_size):
+                    total += int(np.count_nonzero(buf[start:start + chunk_size] == 0x0A))
+                # Освобождаем экспортированный буфер до закрытия mmap
+                del buf
         return total
     except Exception:
         return 0
 
 
+def count_total_lines_cached(path: Path) -> int:
+    """count_total_lines с кэшем в session_state по (path, mtime, size)."""
+    key = _file_state_key('lines', path)
+    if key is None:
+        return 0
+    total = st.session_state.get(key)
+    if total is None:
+        total = count_total_lines(path)
+        st.session_state[key] = total
+    return total
+
+
+def estimate_total_lines(path: Path) -> Tuple[int, bool]:
+    """
+    Число строк для прогресс-бара. Возвращает (строк, это_оценка): точный подсчёт
+    (с кэшем) для файлов до EXACT_COUNT_MAX_BYTES или если он уже есть в кэше, иначе
+    оценка по средней длине строки в первых LINE_ESTIMATE_SAMPLE_BYTES — без полного
+    лишнего прохода по большому файлу перед обработкой.
+    """
+    key = _file_state_key('lines', path)
+    if key is not None and key not in st.session_state and path.stat().st_size > EXACT_COUNT_MAX_BYTES:
+        try:
+            size = path.stat().st_size
+            with open(path, 'rb') as f:
+                buf = f.read(LINE_ESTIMATE_SAMPLE_BYTES)
+            return int(size * buf.count(b'\n') / max(1, len(buf))), True
+        except Exception:
+            return 0, True
+    return count_total_lines_cached(path), False
+
+
 # --------- UI ---------
 st.set_page_config(page_title="csvValidator", page_icon="🧹", layout="wide")
 st.title("csvValidator — просто и надёжно")
@@ -465,13 +806,13 @@ export_delim = "~"
 # Источник данных: либо файл уже на сервере (папка data/), либо загрузка
 server_path = None
 try:
-    server_files = sorted(list(DATA_DIR.glob("*.csv")) + list(DATA_DIR.glob("*.txt")))
+    server_files = sorted(list(DIRS.data.glob("*.csv")) + list(DIRS.data.glob("*.txt")))
 except Exception:
     server_files = []
 options = ["—"] + [p.name for p in server_files]
 chosen = st.selectbox("Выберите файл из папки data/", options, index=0)
 if chosen != "—":
-    server_path = (DATA_DIR / chosen)
+    server_path = (DIRS.data / chosen)
 
 # Tabs for workflow
 process_tab, preview_tab, logs_tab = st.tabs(["Обработка", "Просмотр данных", "Логи"])
@@ -480,28 +821,25 @@ with preview_tab:
     if server_path is None:
         st.info("Выберите файл из папки data/, чтобы увидеть предпросмотр первых строк")
     else:
-        # Читаем только небольшой сэмпл для предпросмотра, не весь файл
+        # Читаем один сэмпл — первые 10 000 строк, не весь файл — и берём из него
+        # и кодировку, и предпросмотр, и статистику колонок
         try:
             with open(server_path, 'rb') as f:
-                sample_bytes = f.read(SAMPLE_BYTES)
+                sample_bytes = read_first_n_lines_bytes(f, n=10000)
         except Exception as e:
             st.error(f"Не удалось прочитать файл: {e}")
             sample_bytes = b""
+        det_file_enc = detect_file_encoding(server_path, sample=sample_bytes)
         hdr, rows, det_enc, det_delim = preview_first_rows(
             sample_bytes,
+            encoding=det_file_enc,
             limit=200,
         )
 
         # Статистика по первым 10 000 строкам: колонок в заголовке и модальное число колонок
         try:
-            with open(server_path, 'rb') as f:
-                first_10k = read_first_n_lines_bytes(f, n=10000)
-            _bio = io.BytesIO(first_10k)
-            _enc = detect_encoding_and_reset(_bio)
-            _bio.seek(0)
-            _ts = io.TextIOWrapper(_bio, encoding=_enc, errors='ignore', newline='')
-            _det_delim, _header_cols_stat, _modal_cols_stat, _stat_rows = analyze_csv_stats_stream(
-                _ts, max_lines=10000, provided_delimiter=None
+            _det_delim, _header_cols_stat, _modal_cols_stat, _stat_rows = analyze_file_stats_cached(
+                server_path, det_file_enc, max_lines=10000, sample=sample_bytes
             )
         except Exception as _e:
             _header_cols_stat, _modal_cols_stat = (len(hdr) if hdr else 0), (len(hdr) if hdr else 0)
@@ -546,9 +884,12 @@ with process_tab:
                 # 2) Формируем пути результатов
                 stem = Path(input_path).stem
                 ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                export_path = EXPORT_DIR / f"{stem}_clean_{ts}.csv"
-                bad_path = BAD_DIR / f"{stem}_bad_{ts}.csv"
-                bad_raw_path = BAD_DIR / f"{stem}_bad_{ts}_raw.txt"  # генерится скриптом автоматически
+                export_path = DIRS.export / f"{stem}_clean_{ts}.csv"
+                bad_path = DIRS.bad / f"{stem}_bad_{ts}.csv"
+                bad_raw_path = DIRS.bad / f"{stem}_bad_{ts}_raw.txt"  # генерится скриптом автоматически
+                # Бинарный канал прогресса: скрипт дописывает счётчики, UI читает последнюю запись
+                progress_path = DIRS.logs / f"{stem}_progress_{ts}.bin"
+                progress_path.write_bytes(b"")
 
                 # 3) Запускаем внешний скрипт на весь файл (с потоковым чтением stdout)
                 script_path = Path(__file__).resolve().parent / "cli_validate.py"
@@ -559,75 +900,114 @@ with process_tab:
                     str(export_path),
                     str(bad_path),
                     "--export_delimiter", export_delim,
+                    "--progress_file", str(progress_path),
                 ]
                 write_log(f"Команда: {' '.join(cmd)}")
 
                 # Оценим число строк для нормального прогресс-бара (без заголовка)
                 status.write("Подсчёт строк файла для оценки прогресса…")
-                total_lines = count_total_lines(input_path)
+                total_lines, total_is_estimate = estimate_total_lines(input_path)
                 total_no_header = max(0, total_lines - 1)
-                prog.progress(0.0, text=f"Запуск обработки… 0/{(total_no_header or '—')}")
+                total_mark = "≈" if total_is_estimate else ""
+                prog.progress(0.0, text=f"Запуск обработки… 0/{total_mark}{(total_no_header or '—')}")
 
                 # Плейсхолдер для живых логов процесса
                 live_logs = st.empty()
-                tail: list[str] = []
+                tail: deque[bytes] = deque(maxlen=200)
+                render_ids = itertools.count()
+
+                def _render_progress(processed: int, new_lines: bool) -> None:
+                    # text_area перерисовываем только при новых строках. ID виджета зависит от метки и
+                    # значения, а повтор ID в одном прогоне Streamlit отвергает (DuplicateWidgetID),
+                    # поэтому у каждой отрисовки свой key
+                    if new_lines:
+                        live_logs.text_area("Прогресс и логи процесса",
+                                            value=b"\n".join(tail).decode('utf-8', errors='replace'), height=240,
+                                            key=f"live_logs_{next(render_ids)}")
+                    if total_no_header > 0:
+                        frac = min(processed / total_no_header, 0.99)
+                        prog.progress(frac, text=f"Обработка… {processed:,}/{total_mark}{total_no_header:,}".replace(',', ' '))
+                    else:
+                        # Неизвестен общий объём — имитируем плавный прогресс
+                        base = (processed % 100) / 100.0
+                        prog.progress(base, text=f"Обработка… обработано {processed:,} строк".replace(',', ' '))
 
-                # Запуск процесса с построчным чтением stdout
+                # Запуск процесса: stdout читаем в бинарном режиме крупными блоками и режем на
+                # строки сами; декодируются только хвост для UI и строка сводки
                 t0 = time.time()
                 with subprocess.Popen(
                         cmd,
                         stdout=subprocess.PIPE,
                         stderr=subprocess.STDOUT,
-                        text=True,
-                        bufsize=1,
-                        universal_newlines=True,
-                ) as proc:
+                        bufsize=PIPE_BUFFER_BYTES,
+                        env={**os.environ, "PYTHONIOENCODING": "utf-8"},
+                ) as proc, open(progress_path, 'rb', buffering=0) as progress_in:
                     status.write("Идёт обработка, логи обновляются в реальном времени…")
                     valid_seen = 0
                     bad_seen = 0
                     valid_rows = None
                     bad_rows = None
+                    # Каждое обновление виджета — обмен с браузером, поэтому перерисовываем
+                    # не чаще UI_REFRESH_SECONDS, а строки лога копим в хвосте
+                    last_ui = 0.0
+                    new_lines = False
 
                     assert proc.stdout is not None
-                    for raw_line in proc.stdout:
-                        line = raw_line.rstrip("\n")
-                        if not line:
-                            continue
-                        # Пишем в лог сессии
-                        write_log(line)
-                        # Обновляем хвост логов в UI
-                        tail.append(line)
-                        if len(tail) > 200:
-                            tail = tail[-200:]
-                        live_logs.text_area("Прогресс и логи процесса", value="\n".join(tail), height=240)
-
-                        # Парсим прогресс
+                    chunks: queue.Queue = queue.Queue()
+                    reader = threading.Thread(target=pump_output, args=(proc.stdout, chunks), daemon=True)
+                    reader.start()
+                    residue = b""
+                    eof = False
+                    while not eof:
+                        # Ждём вывод не дольше UI_REFRESH_SECONDS: прогресс обновляется и при молчащем CLI
                         try:
-                            if "Обработано валидных строк:" in line:
-                                # формат: ✅ Обработано валидных строк: 10000
-                                num = int(''.join(ch for ch in line.split(':')[-1] if ch.isdigit()))
-                                valid_seen = max(valid_seen, num)
-                            elif "Невалидных строк:" in line:
-                                num = int(''.join(ch for ch in line.split(':')[-1] if ch.isdigit()))
-                                bad_seen = max(bad_seen, num)
-                            elif line.strip().startswith("__SUMMARY__"):
-                                parts = dict(p.split('=') for p in line.strip().split()[1:])
-                                valid_rows = int(parts.get('VALID')) if 'VALID' in parts else None
-                                bad_rows = int(parts.get('BAD')) if 'BAD' in parts else None
-                        except Exception:
-                            pass
-
-                        processed = valid_seen + bad_seen
-                        if total_no_header > 0:
-                            frac = min(processed / total_no_header, 0.99)
-                            prog.progress(frac, text=f"Обработка… {processed:,}/{total_no_header:,}".replace(',', ' '))
+                            chunk = chunks.get(timeout=UI_REFRESH_SECONDS)
+                        except queue.Empty:
+                            chunk = None
+                        if chunk:
+                            lines = (residue + chunk).split(b"\n")
+                            residue = lines.pop()
+                        elif chunk is None:
+                            lines = []
                         else:
-                            # Неизвестен общий объём — имитируем плавный прогресс
-                            base = (processed % 100) / 100.0
-                            prog.progress(base, text=f"Обработка… обработано {processed:,} строк".replace(',', ' '))
-
+                            eof = True
+                            lines = [residue]
+                        for raw_line in lines:
+                            line = raw_line.rstrip(b"\r")
+                            if not line:
+                                continue
+                            # Пишем в лог сессии
+                            write_log(line)
+                            # Обновляем хвост логов (deque сам отбрасывает старые строки)
+                            tail.append(line)
+                            new_lines = True
+
+                            # Итоговая сводка скрипта; счётчики прогресса читаются из progress_path
+                            if line.lstrip().startswith(b"__SUMMARY__"):
+                                try:
+                                    parts = dict(p.split('=') for p in line.decode('utf-8').split()[1:])
+                                    valid_rows = int(parts.get('VALID')) if 'VALID' in parts else None
+                                    bad_rows = int(parts.get('BAD')) if 'BAD' in parts else None
+                                except Exception:
+                                    pass
+
+                        now = time.monotonic()
+                        if now - last_ui >= UI_REFRESH_SECONDS:
+                            last_ui = now
+                            record = read_progress(progress_in)
+                            if record is not None:
+                                valid_seen, bad_seen, _phase = record
+                            _render_progress(valid_seen + bad_seen, new_lines)
+                            new_lines = False
+
+                    record = read_progress(progress_in)
+                    if record is not None:
+                        valid_seen, bad_seen, _phase = record
+                    _render_progress(valid_seen + bad_seen, new_lines)
+                    reader.join()
                     ret = proc.wait()
                     dt = time.time() - t0
+                progress_path.unlink(missing_ok=True)
 
                 if ret != 0:
                     prog.progress(0.0, text="Сбой обработки")
@@ -652,7 +1032,9 @@ with process_tab:
                         write_log(f"Статистика: VALID={valid_rows}, BAD={bad_rows}, TOTAL(no header)={total_rows}")
                     status.write(summary_msg)
                     write_log(summary_msg)
-                    saved_msg = f"Файлы сохранены: clean → {export_path}, bad → {bad_path}, bad_raw → {bad_raw_path}"
+                    saved_msg = (f"Файлы сохранены: clean → {export_path}, "
+                                 f"bad → {bad_path if bad_path.exists() else '—'}, "
+                                 f"bad_raw → {bad_raw_path if bad_raw_path.exists() else '—'}")
                     st.success("Обработка завершена успешно")
                     st.caption(saved_msg)
 
@@ -691,12 +1073,15 @@ with process_tab:
                                 mime="text/csv; charset=utf-8",
                             )
                         with col2:
-                            st.download_button(
-                                f"Скачать превью ошибок (первые {preview_limit:,} строк)".replace(',', ' '),
-                                data=_first_n_lines_bytes(bad_path, preview_limit),
-                                file_name=f"preview_{bad_path.name}",
-                                mime="text/csv; charset=utf-8",
-                            )
+                            if bad_path.exists():
+                                st.download_button(
+                                    f"Скачать превью ошибок (первые {preview_limit:,} строк)".replace(',', ' '),
+                                    data=_first_n_lines_bytes(bad_path, preview_limit),
+                                    file_name=f"preview_{bad_path.name}",
+                                    mime="text/csv; charset=utf-8",
+                                )
+                            else:
+                                st.caption("Файл ошибок не создан — дефектных строк нет")
                         with col3:
                             if bad_raw_path.exists():
                                 st.download_button(
@@ -710,7 +1095,8 @@ with process_tab:
 
                         st.info(
                             "Полные файлы сохранены на диск и не загружаются в память: "
-                            f"clean → {export_path}, bad → {bad_path}, bad_raw → {bad_raw_path if bad_raw_path.exists() else '—'}.\n"
+                            f"clean → {export_path}, bad → {bad_path if bad_path.exists() else '—'}, "
+                            f"bad_raw → {bad_raw_path if bad_raw_path.exists() else '—'}.\n"
                             "Скачайте их напрямую с сервера/диска, если нужны целиком."
                         )
                     except Exception as save_err:
@@ -727,9 +1113,11 @@ with process_tab:
 with logs_tab:
     log_file = get_session_log_path()
     st.caption(f"Последние строки логов для вашей сессии: {log_file}")
-    auto = st.checkbox("Автообновление каждые 5 секунд", value=True, key="logs_auto")
-    log_text = read_log_tail(log_file, max_lines=500)
-    st.text_area("Логи", value=log_text, height=300)
-    if auto:
-        time.sleep(5)
-        st.rerun()
+    auto = st.checkbox(f"Автообновление каждые {LOGS_REFRESH_SECONDS} секунд", value=True, key="logs_auto")
+
+    @st.fragment(run_every=LOGS_REFRESH_SECONDS if auto else None)
+    def _logs_fragment():
+        flush_log()
+        st.text_area("Логи", value=read_log_tail(log_file, max_lines=500), height=300)
+
+    _logs_fragment()